@@ -27,6 +27,22 @@ def _resolve_base_dir() -> str:
 
 BASE_DIR = _resolve_base_dir()
 
+# HTTP下载共用的会话，复用TCP/TLS连接（多个模型文件从同一主机下载时省去重复握手）
+_http_session = requests.Session()
+_http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_http_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+# 流式下载每次写入的块大小，文件不会整体读入内存
+HTTP_DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+def _http_download(url: str, path: Path, timeout: float) -> None:
+    """通过共用会话流式下载url到path"""
+    with _http_session.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=HTTP_DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
 def get_work_dir():
     """获取工作目录（模型目录的上一级），防止出现 models/models 重复层级。"""
     env_dir = os.environ.get("PPOCR_MODELS_DIR")
@@ -400,11 +416,7 @@ def download_model(config: Dict[str, Any], models_dir: Path) -> bool:
 
             temp_tar = local_path.with_suffix('.tar')
             print(f"Downloading {config['remote_url']}...")
-            response = requests.get(config["remote_url"], timeout=300)
-            response.raise_for_status()
-
-            with open(temp_tar, 'wb') as f:
-                f.write(response.content)
+            _http_download(config["remote_url"], temp_tar, timeout=300)
 
             # 解压到指定目录
             extract_path = models_dir / config.get("extract_path", local_path.parent)
@@ -418,11 +430,7 @@ def download_model(config: Dict[str, Any], models_dir: Path) -> bool:
         else:
             # 直接下载文件
             print(f"Downloading {config['remote_url']}...")
-            response = requests.get(config["remote_url"], timeout=30)
-            response.raise_for_status()
-
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
+            _http_download(config["remote_url"], local_path, timeout=30)
 
             print(f"Successfully downloaded {config['remote_url']}")
 
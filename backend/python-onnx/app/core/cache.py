@@ -0,0 +1,72 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def hash_bytes(data):
+    """计算字节数据（或任意支持缓冲区协议的对象，如numpy数组）的哈希值"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def hash_file(fileobj, chunk_size=1 << 20):
+    """分块计算文件对象的哈希值（不把整个文件读入内存），完成后回到文件开头"""
+    hasher = hashlib.blake2b(digest_size=16)
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        hasher.update(chunk)
+    fileobj.seek(0)
+    return hasher.digest()
+
+
+class LRUCache:
+    """
+    线程安全的LRU缓存，超出容量时淘汰最久未使用的条目
+
+    指定 max_bytes 和 sizeof 时还按条目总大小限制容量，单个超过上限的条目不会被缓存
+    """
+
+    def __init__(self, max_size=256, max_bytes=None, sizeof=None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._sizes = {}
+        self._total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，命中时将其移动到最近使用的位置；未命中返回None"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """写入缓存"""
+        size = self._sizeof(value) if self._sizeof is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._total_bytes -= self._sizes.pop(key, 0)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if size:
+                self._sizes[key] = size
+                self._total_bytes += size
+            while len(self._data) > self.max_size or (
+                self.max_bytes is not None and self._total_bytes > self.max_bytes
+            ):
+                old_key, _ = self._data.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key, 0)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -17,15 +17,13 @@ try:
     import fitz  # pymupdf
 
     def pdf_to_images(pdf_path, dpi=200):
-        doc = fitz.open(pdf_path)
         images = []
-        for page in doc:
-            pix = page.get_pixmap(dpi=dpi)
-            img = np.frombuffer(pix.samples, dtype=np.uint8)
-            img = img.reshape((pix.height, pix.width, pix.n))
-            if pix.n == 4:
-                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-            images.append(img)
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                # 直接渲染不带alpha通道的RGB图像，得到连续内存，无需再转换去除alpha
+                pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+                img = np.frombuffer(pix.samples, dtype=np.uint8).reshape((pix.height, pix.width, 3))
+                images.append(img)
         return images
 
 except ImportError:
@@ -55,12 +53,8 @@ class OCRLogic:
                 text = self._ocr_images(images, file, save_txt, merge_txt, output_img=output_img, is_pdf=True, pdf_progress_callback=pdf_progress_callback, max_workers=max_workers)
             else:
                 try:
-                    if file.lower().endswith('.bmp'):
-                        img = cv2.imdecode(np.fromfile(file, dtype=np.uint8), cv2.IMREAD_COLOR)
-                    else:
-                        with open(file, 'rb') as fimg:
-                            img_array = np.frombuffer(fimg.read(), np.uint8)
-                        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+                    # np.fromfile直接把文件读入数组，不产生中间bytes对象，也支持非ASCII路径
+                    img = cv2.imdecode(np.fromfile(file, dtype=np.uint8), cv2.IMREAD_COLOR)
                 except Exception as e:
                     self.status_callback(f"图片读取失败: {file}，错误: {e}")
                     if file_time_callback:
@@ -112,7 +106,7 @@ class OCRLogic:
 
         def process_page(i_img):
             i, img = i_img
-            img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+            img_cv = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
             result = self.model.ocr(img_cv)
             if output_img:
                 out_img_path = os.path.join(out_dir, f"{Path(pdf_path).stem}_page{i+1}_ocr.jpg")
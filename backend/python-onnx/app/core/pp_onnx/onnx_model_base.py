@@ -6,6 +6,10 @@ preprocess/infer/postprocess interface and convenience helpers for
 loading sessions and input/output names. Inherits from existing
 PredictBase to reuse session and I/O utilities.
 """
+import hashlib
+import logging
+import os
+import threading
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -14,6 +18,190 @@ import numpy as np
 
 import onnxruntime
 
+logger = logging.getLogger(__name__)
+
+# Thread pool sizes for every ONNX Runtime session. 0 keeps the ORT default
+# (one intra-op thread per physical core), which is fastest for a single
+# request. When several inferences run concurrently (multi-page OCR,
+# batched PP-Structure requests) set ORT_INTRA_OP_THREADS=1 and let the
+# request-level thread pools provide the parallelism instead, so the
+# sessions do not oversubscribe the cores.
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+
+# Let every session of the process share one global intra-op/inter-op thread
+# pool (sized by the two settings above) instead of each model creating its
+# own. With the layout, detection, recognition and orientation models loaded
+# this avoids several pools of one thread per core competing for the CPU.
+ORT_SHARED_THREAD_POOL = os.getenv("ORT_SHARED_THREAD_POOL", "0").lower() in ("1", "true", "yes")
+
+# CPU memory arena. The arena keeps freed buffers for reuse, which is fastest
+# but lets resident memory settle at the largest input ever seen (a 300-DPI
+# page, a large batch) for every session. ORT_CPU_MEM_ARENA=0 disables it;
+# ORT_ARENA_SHRINKAGE=1 keeps it and releases unused chunks after each run.
+ORT_CPU_MEM_ARENA = os.getenv("ORT_CPU_MEM_ARENA", "1").lower() in ("1", "true", "yes")
+ORT_ARENA_SHRINKAGE = os.getenv("ORT_ARENA_SHRINKAGE", "0").lower() in ("1", "true", "yes")
+
+# IO binding for CUDA sessions. Inputs are copied into device OrtValues that
+# are reused (updated in place) while the input shape stays the same, and the
+# outputs are bound to host memory, so session.run does not allocate and copy
+# fresh device buffers on every call. Has no effect on CPU-only sessions.
+ORT_IO_BINDING = os.getenv("ORT_IO_BINDING", "0").lower() in ("1", "true", "yes")
+
+# Execution providers to try, in order, e.g. "DmlExecutionProvider,CPUExecutionProvider"
+# with onnxruntime-directml. Empty keeps the use_gpu choice of each model (CUDA,
+# then DirectML, when use_gpu is set, otherwise CPU). Providers the installed
+# onnxruntime build does not have are skipped, CPU is always the last fallback.
+ORT_PROVIDERS = [name.strip() for name in os.getenv("ORT_PROVIDERS", "").split(",") if name.strip()]
+
+# Per-provider session options, built from the GPU id
+PROVIDER_OPTIONS = {
+    "CUDAExecutionProvider": lambda gpu_id: {"cudnn_conv_algo_search": "DEFAULT", "device_id": gpu_id},
+    "DmlExecutionProvider": lambda gpu_id: {"device_id": gpu_id},
+}
+
+# Directory for graph-optimized copies of the models. When set, the first
+# session for a model saves its optimized graph there and later processes
+# load that copy with graph optimization disabled, skipping the rewrites at
+# startup. Only used for CPU sessions; empty disables the cache.
+ORT_OPTIMIZED_MODEL_DIR = os.getenv("ORT_OPTIMIZED_MODEL_DIR", "")
+
+
+_global_thread_pool_lock = threading.Lock()
+_global_thread_pool_ready: Optional[bool] = None
+
+
+def _use_global_thread_pool() -> bool:
+    """Create the global thread pools on first use; False when they cannot be used."""
+    global _global_thread_pool_ready
+    with _global_thread_pool_lock:
+        if _global_thread_pool_ready is None:
+            try:
+                # Only possible before the ORT environment exists, i.e. before the first session
+                onnxruntime.capi._pybind_state.set_global_thread_pool_sizes(ORT_INTRA_OP_THREADS, ORT_INTER_OP_THREADS)
+                _global_thread_pool_ready = True
+            except Exception as e:
+                logger.warning("Shared ORT thread pool unavailable, using per-session threads: %s", e)
+                _global_thread_pool_ready = False
+        return _global_thread_pool_ready
+
+
+def build_session_options() -> onnxruntime.SessionOptions:
+    """Create the SessionOptions shared by all models."""
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    if ORT_SHARED_THREAD_POOL and _use_global_thread_pool():
+        sess_options.use_per_session_threads = False
+    else:
+        sess_options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+        sess_options.inter_op_num_threads = ORT_INTER_OP_THREADS
+    sess_options.enable_cpu_mem_arena = ORT_CPU_MEM_ARENA
+    return sess_options
+
+
+def build_run_options(use_gpu: bool = False, gpu_id: int = 0) -> Optional[onnxruntime.RunOptions]:
+    """Create the RunOptions for each inference call (None when the defaults suffice)."""
+    if not ORT_ARENA_SHRINKAGE:
+        return None
+    run_options = onnxruntime.RunOptions()
+    devices = "cpu:0;gpu:%d" % gpu_id if use_gpu else "cpu:0"
+    run_options.add_run_config_entry("memory.enable_memory_arena_shrinkage", devices)
+    return run_options
+
+
+def resolve_providers(use_gpu: bool = False, gpu_id: int = 0) -> List[Any]:
+    """Execution providers (with options) for a new session, limited to those this ORT build has."""
+    if ORT_PROVIDERS:
+        requested = ORT_PROVIDERS
+    elif use_gpu:
+        requested = ["CUDAExecutionProvider", "DmlExecutionProvider"]
+    else:
+        requested = []
+
+    available = onnxruntime.get_available_providers()
+    providers = []
+    for name in requested:
+        if name == "CPUExecutionProvider":
+            continue
+        if name not in available:
+            if ORT_PROVIDERS:
+                logger.warning("Execution provider %s is not available in this onnxruntime build", name)
+            continue
+        options = PROVIDER_OPTIONS.get(name)
+        providers.append((name, options(gpu_id)) if options else name)
+        if not ORT_PROVIDERS:
+            # With use_gpu only the first available GPU provider is used
+            break
+    if use_gpu and not ORT_PROVIDERS and not providers:
+        logger.warning("No GPU execution provider available in this onnxruntime build, falling back to CPU")
+    providers.append("CPUExecutionProvider")
+    return providers
+
+
+def optimized_model_path(model_path: str) -> Optional[Path]:
+    """Cache file for the optimized graph of model_path, keyed by file identity and ORT version."""
+    if not ORT_OPTIMIZED_MODEL_DIR:
+        return None
+    stat = os.stat(model_path)
+    key = "%s|%d|%d|%s" % (os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns, onnxruntime.__version__)
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+    return Path(ORT_OPTIMIZED_MODEL_DIR) / ("%s_%s.onnx" % (Path(model_path).parent.name, digest))
+
+
+def _create_session(model_path: str, sess_options: onnxruntime.SessionOptions, providers: List[Any],
+                    cache_path: Optional[Path]) -> onnxruntime.InferenceSession:
+    """Create a session, reading or filling the optimized-graph cache at cache_path."""
+    tmp_path = None
+    if cache_path is not None and cache_path.exists():
+        # Optimized on an earlier run, load it without repeating the rewrites
+        sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        model_path = str(cache_path)
+    elif cache_path is not None:
+        # Save under a per-process name first, concurrent workers may optimize the same model
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name("%s.%d.tmp" % (cache_path.name, os.getpid()))
+        sess_options.optimized_model_filepath = str(tmp_path)
+
+    onnx_session = onnxruntime.InferenceSession(model_path, sess_options, providers=providers)
+    if tmp_path is not None and tmp_path.exists():
+        os.replace(tmp_path, cache_path)
+    return onnx_session
+
+
+def prebuild_optimized_model(model_path: str) -> Optional[Path]:
+    """Fill the optimized-graph cache for model_path ahead of the first load.
+
+    Meant to run right after a model is installed, so the first service
+    start already finds the optimized copy. Does nothing when the cache is
+    disabled or already holds this model; returns the cache file, if any.
+    """
+    cache_path = optimized_model_path(model_path)
+    if cache_path is None or cache_path.exists():
+        return cache_path
+    _create_session(model_path, build_session_options(), ["CPUExecutionProvider"], cache_path)
+    logger.info("Saved optimized graph of %s to %s", model_path, cache_path)
+    return cache_path
+
+
+def normalize_to_chw(image: np.ndarray, mean, std, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Convert an HWC image to contiguous float32 CHW holding (image / 255 - mean) / std.
+
+    The division and the mean/std normalization are folded into one
+    per-channel scale and bias, applied in place on a single float32
+    buffer that already has the CHW layout, instead of producing a float64
+    temporary for every step followed by a transposed copy. ``out`` may be
+    a float32 CHW view into a larger buffer (e.g. one row of a batch).
+    """
+    std = np.asarray(std, dtype=np.float32)
+    scale = (np.float32(1.0 / 255.0) / std).reshape(-1, 1, 1)
+    bias = (-np.asarray(mean, dtype=np.float32) / std).reshape(-1, 1, 1)
+    chw = np.empty((image.shape[2], image.shape[0], image.shape[1]), dtype=np.float32) if out is None else out
+    chw[...] = image.transpose(2, 0, 1)
+    chw *= scale
+    chw += bias
+    return chw
+
 
 class ONNXModelBase(object):
     """Standalone ONNX model base (no dependency on PredictBase).
@@ -29,12 +217,16 @@ class ONNXModelBase(object):
     """
 
     def get_onnx_session(self, model_dir, use_gpu, gpu_id = 0):
-        if use_gpu:
-            providers =[('CUDAExecutionProvider',{"cudnn_conv_algo_search": "DEFAULT","device_id": gpu_id}),'CPUExecutionProvider']
-        else:
-            providers =['CPUExecutionProvider']
+        providers = resolve_providers(use_gpu, gpu_id)
+        provider_names = [provider[0] if isinstance(provider, tuple) else provider for provider in providers]
 
-        onnx_session = onnxruntime.InferenceSession(model_dir, None, providers=providers)
+        sess_options = build_session_options()
+        if "DmlExecutionProvider" in provider_names:
+            # DirectML does not support memory patterns
+            sess_options.enable_mem_pattern = False
+        cache_path = optimized_model_path(model_dir) if provider_names == ["CPUExecutionProvider"] else None
+        onnx_session = _create_session(model_dir, sess_options, providers, cache_path)
+        logger.info("Loaded %s with providers %s", model_dir, onnx_session.get_providers())
         return onnx_session
 
     def get_output_name(self, onnx_session):
@@ -84,6 +276,11 @@ class ONNXModelBase(object):
         self.input_names = [i.name for i in self.session.get_inputs()]
         self.output_names = [o.name for o in self.session.get_outputs()]
         self.input_shapes = [i.shape for i in self.session.get_inputs()]
+        self.run_options = build_run_options(self.use_gpu, self.gpu_id)
+        use_cuda = "CUDAExecutionProvider" in self.session.get_providers()
+        self.io_binding_device = "cuda" if ORT_IO_BINDING and use_cuda else None
+        # IOBinding and its bound buffers are not thread-safe, keep one set per thread
+        self._io_local = threading.local()
 
     def preprocess(self, *args, **kwargs) -> Dict[str, np.ndarray]:
         """Convert inputs to a dict mapping input names to numpy arrays.
@@ -103,11 +300,37 @@ class ONNXModelBase(object):
 
     def infer(self, input_feed: Dict[str, np.ndarray]) -> List[np.ndarray]:
         """Run ONNX inference and return raw outputs."""
+        if self.io_binding_device is not None:
+            return self._infer_with_io_binding(input_feed)
         # Ensure input keys exist in model inputs
         # ONNX Runtime accepts a dict of name->ndarray
-        outputs = self.session.run(self.output_names, input_feed=input_feed)
+        outputs = self.session.run(self.output_names, input_feed=input_feed, run_options=self.run_options)
         return outputs
 
+    def _infer_with_io_binding(self, input_feed: Dict[str, np.ndarray]) -> List[np.ndarray]:
+        """Run inference through this thread's IOBinding, reusing device input buffers."""
+        local = self._io_local
+        binding = getattr(local, "binding", None)
+        if binding is None:
+            binding = local.binding = self.session.io_binding()
+            local.inputs = {}
+            for name in self.output_names:
+                binding.bind_output(name, "cpu")
+
+        for name, array in input_feed.items():
+            array = np.ascontiguousarray(array)
+            key = (array.shape, array.dtype)
+            cached = local.inputs.get(name)
+            if cached is not None and cached[0] == key:
+                cached[1].update_inplace(array)
+            else:
+                value = onnxruntime.OrtValue.ortvalue_from_numpy(array, self.io_binding_device, self.gpu_id)
+                cached = local.inputs[name] = (key, value)
+            binding.bind_ortvalue_input(name, cached[1])
+
+        self.session.run_with_iobinding(binding, self.run_options)
+        return binding.copy_outputs_to_cpu()
+
     def run(self, *args, **kwargs) -> Any:
         """High-level API: preprocess -> infer -> postprocess."""
         input_feed = self.preprocess(*args, **kwargs)
@@ -3,6 +3,8 @@ Standalone PP-DocLayout ONNX Inference
 Implements layout detection using PP-DocLayout-L ONNX model
 """
 
+import logging
+
 import cv2
 import numpy as np
 import onnxruntime as ort
@@ -10,9 +12,11 @@ from pathlib import Path
 from typing import List, Dict, Tuple
 import yaml
 
-from .onnx_model_base import ONNXModelBase
+from .onnx_model_base import ONNXModelBase, normalize_to_chw
 from ...config import get_model_path_from_registry
 
+logger = logging.getLogger(__name__)
+
 
 class PPDocLayoutONNX(ONNXModelBase):
     def __init__(self, model_path: str = None, use_gpu: bool = False, gpu_id: int = 0):
@@ -104,34 +108,54 @@ class PPDocLayoutONNX(ONNXModelBase):
             if image is None:
                 raise ValueError(f"Could not load image from {image}")
 
+        return self._build_inputs([image])
+
+    def _preprocess_one(self, image: np.ndarray, out: np.ndarray = None) -> Tuple[np.ndarray, List[float]]:
+        """
+        Resize and normalize a single image
+
+        Args:
+            image: Input image (BGR format)
+            out: Optional float32 CHW buffer (e.g. one row of a batch) to normalize into
+
+        Returns:
+            (chw, [scale_h, scale_w]): CHW float32 tensor and its scale factors
+        """
         # Get original size
         h, w = image.shape[:2]
 
         # Resize to target size (from config) - stretches to fill the canvas
         resized = cv2.resize(image, self.target_size)
 
-        # Normalize using config values
-        normalized = resized.astype(np.float32) / 255.0
-        normalized = (normalized - self.mean) / self.std
-
-        # Convert to CHW format
-        chw = np.transpose(normalized, (2, 0, 1))
-
-        # Add batch dimension
-        batch_input = np.expand_dims(chw, 0)
+        # Normalize using config values, directly into CHW format
+        chw = normalize_to_chw(resized, self.mean, self.std, out=out)
 
         # Calculate scale factors for coordinate conversion
         scale_w = self.target_size[0] / w
         scale_h = self.target_size[1] / h
 
+        return chw, [scale_h, scale_w]
+
+    def _build_inputs(self, images: List[np.ndarray]) -> Dict[str, np.ndarray]:
+        """Build the ONNX input feed for a batch of images (all resized to target_size)"""
+        # Normalize every image straight into its row of the batch tensor
+        batch = np.empty((len(images), 3, self.target_size[1], self.target_size[0]), dtype=np.float32)
+        scales = [self._preprocess_one(image, out=batch[i])[1] for i, image in enumerate(images)]
+
         # Return inputs dict for ONNX model
-        inputs = {
-            'im_shape': np.array([self.target_size], dtype=np.float32),  # [1, 2]
-            'image': batch_input.astype(np.float32),  # [1, 3, H, W]
-            'scale_factor': np.array([[scale_h, scale_w]], dtype=np.float32)  # [1, 2]
+        return {
+            'im_shape': np.array([self.target_size] * len(images), dtype=np.float32),  # [N, 2]
+            'image': batch,  # [N, 3, H, W]
+            'scale_factor': np.array(scales, dtype=np.float32)  # [N, 2]
         }
 
-        return inputs
+    @property
+    def supports_batch(self) -> bool:
+        """Whether the exported model has a dynamic batch dimension"""
+        for node in self.session.get_inputs():
+            if node.name == 'image':
+                return not isinstance(node.shape[0], int) or node.shape[0] != 1
+        return False
 
     def postprocess(self, outputs: List[np.ndarray], image: np.ndarray, original_size: Tuple[int, int], conf_threshold: float = 0.5) -> List[Dict]:
         """
@@ -205,7 +229,40 @@ class PPDocLayoutONNX(ONNXModelBase):
 
         return regions
 
-    def visualize(self, image: np.ndarray, regions: List[Dict], output_path: str = None) -> np.ndarray:
+    def detect_batch(self, images: List[np.ndarray], conf_threshold: float = 0.5) -> List[List[Dict]]:
+        """
+        Run layout detection on several images with a single session run
+
+        Every image is stretched to the same target size, so they stack into one
+        batch. The detections come back concatenated together with a per-image
+        box count, which is used to split them. Falls back to one run per image
+        when the model has a fixed batch size of 1 or does not report per-image
+        counts.
+
+        Args:
+            images: Input images
+            conf_threshold: Confidence threshold for detections
+
+        Returns:
+            List of detected layout regions for each image
+        """
+        if len(images) <= 1 or not self.supports_batch:
+            return [self.detect(image, conf_threshold=conf_threshold) for image in images]
+
+        outputs = self.infer(self._build_inputs(images))
+        counts = outputs[1].reshape(-1) if len(outputs) > 1 else None
+        if counts is None or len(counts) != len(images) or int(counts.sum()) != len(outputs[0]):
+            return [self.detect(image, conf_threshold=conf_threshold) for image in images]
+
+        results = []
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        for i, image in enumerate(images):
+            detections = outputs[0][offsets[i]:offsets[i + 1]]
+            original_size = (image.shape[1], image.shape[0])  # w, h
+            results.append(self.postprocess([detections], image, original_size=original_size, conf_threshold=conf_threshold))
+        return results
+
+    def visualize(self, image: np.ndarray, regions: List[Dict], output_path: str = None, to_bgr: bool = False, out: np.ndarray = None) -> np.ndarray:
         """
         Visualize detected regions on image
 
@@ -213,18 +270,30 @@ class PPDocLayoutONNX(ONNXModelBase):
             image: Original image
             regions: Detected regions
             output_path: Path to save visualization (optional)
+            to_bgr: Treat the input as RGB and draw on a BGR copy, so the result can be
+                encoded by OpenCV without another conversion pass (the color conversion
+                doubles as the copy)
+            out: Buffer to draw on (pass ``image`` itself to draw in place when the
+                original is no longer needed). By default the image is copied once.
 
         Returns:
             Image with visualizations
         """
-        vis_image = image.copy()
-
-        print(f"Visualizing {len(regions)} regions")
-        type_counts = {}
-        for region in regions:
-            region_type = region.get('type', 'unknown')
-            type_counts[region_type] = type_counts.get(region_type, 0) + 1
-        print(f"Region types: {type_counts}")
+        if to_bgr:
+            vis_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=out)
+        elif out is None:
+            vis_image = image.copy()
+        else:
+            if out is not image:
+                np.copyto(out, image)
+            vis_image = out
+
+        if logger.isEnabledFor(logging.DEBUG):
+            type_counts = {}
+            for region in regions:
+                region_type = region.get('type', 'unknown')
+                type_counts[region_type] = type_counts.get(region_type, 0) + 1
+            logger.debug("Visualizing %d regions, region types: %s", len(regions), type_counts)
 
         # Color map for different types - expanded to cover all PP-DocLayout classes
         colors = {
@@ -261,16 +330,16 @@ class PPDocLayoutONNX(ONNXModelBase):
 
             # Validate bbox
             if len(bbox) != 4:
-                print(f"Invalid bbox length for {label}: {bbox}")
+                logger.debug("Invalid bbox length for %s: %s", label, bbox)
                 continue
 
             x1, y1, x2, y2 = bbox
             if x2 <= x1 or y2 <= y1:
-                print(f"Invalid bbox coordinates for {label}: {bbox}")
+                logger.debug("Invalid bbox coordinates for %s: %s", label, bbox)
                 continue
 
             if x1 < 0 or y1 < 0 or x2 > image.shape[1] or y2 > image.shape[0]:
-                print(f"Bbox out of bounds for {label}: {bbox}, image shape: {image.shape}")
+                logger.debug("Bbox out of bounds for %s: %s, image shape: %s", label, bbox, image.shape)
                 continue
 
             color = colors.get(label, (255, 255, 255))  # White for unknown
@@ -285,11 +354,11 @@ class PPDocLayoutONNX(ONNXModelBase):
 
             drawn_count += 1
 
-        print(f"Successfully drew {drawn_count} out of {len(regions)} regions")
+        logger.debug("Successfully drew %d out of %d regions", drawn_count, len(regions))
 
         if output_path:
             cv2.imwrite(output_path, vis_image)
-            print(f"Visualization saved to {output_path}")
+            logger.info("Visualization saved to %s", output_path)
 
         return vis_image
 
@@ -321,11 +390,11 @@ def main():
     for region in regions:
         print(f"  {region}")
 
-    # Visualize
+    # Visualize (the input is not needed afterwards, draw on it directly)
     if output_path:
-        vis_image = detector.visualize(image, regions, output_path)
+        vis_image = detector.visualize(image, regions, output_path, out=image)
     else:
-        vis_image = detector.visualize(image, regions)
+        vis_image = detector.visualize(image, regions, out=image)
         cv2.imshow("PP-DocLayout Detection", vis_image)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
@@ -10,7 +10,7 @@ from pathlib import Path
 from typing import List, Dict, Tuple
 import yaml
 
-from .onnx_model_base import ONNXModelBase
+from .onnx_model_base import ONNXModelBase, normalize_to_chw
 from ...config import get_model_path_from_registry
 
 
@@ -108,6 +108,23 @@ class PPLCNetDocONNX(ONNXModelBase):
             if image is None:
                 raise ValueError(f"Could not load image from {image}")
 
+        # Add batch dimension
+        batch_input = np.expand_dims(self._preprocess_one(image), 0)
+
+        # Return inputs dict for ONNX model - PP-OCRv5 cls expects 'x'
+        inputs = {
+            'x': batch_input,  # [1, 3, 224, 224]
+        }
+
+        return inputs
+
+    def _preprocess_one(self, image: np.ndarray) -> np.ndarray:
+        """
+        Resize, center crop and normalize a single image
+
+        Returns:
+            CHW float32 tensor of shape [3, crop_size, crop_size]
+        """
         # Resize image with short side to resize_short
         h, w = image.shape[:2]
         if h < w:
@@ -124,22 +141,16 @@ class PPLCNetDocONNX(ONNXModelBase):
         start_w = (new_w - crop_w) // 2
         cropped = resized[start_h:start_h + crop_h, start_w:start_w + crop_w]
 
-        # Normalize using config values
-        normalized = cropped.astype(np.float32) / 255.0
-        normalized = (normalized - self.mean) / self.std
-
-        # Convert to CHW format
-        chw = np.transpose(normalized, (2, 0, 1))
-
-        # Add batch dimension
-        batch_input = np.expand_dims(chw, 0)
+        # Normalize using config values, directly into CHW format
+        return normalize_to_chw(cropped, self.mean, self.std)
 
-        # Return inputs dict for ONNX model - PP-OCRv5 cls expects 'x'
-        inputs = {
-            'x': batch_input.astype(np.float32),  # [1, 3, 224, 224]
-        }
-
-        return inputs
+    @property
+    def supports_batch(self) -> bool:
+        """Whether the exported model has a dynamic batch dimension"""
+        for node in self.session.get_inputs():
+            if node.name == 'x':
+                return not isinstance(node.shape[0], int) or node.shape[0] != 1
+        return False
 
     def postprocess(self, outputs: List[np.ndarray], image: np.ndarray, original_size: Tuple[int, int], conf_threshold: float = 0.5) -> List[Dict]:
         """
@@ -188,6 +199,30 @@ class PPLCNetDocONNX(ONNXModelBase):
         # Return the first result
         return results[0] if results else {'angle': '0', 'confidence': 0.0}
 
+    def classify_batch(self, images: List[np.ndarray]) -> List[Dict]:
+        """
+        Run document orientation classification on several images with a single session run
+
+        Every image is cropped to the same crop_size, so they stack into one batch.
+        Falls back to one run per image when the model has a fixed batch size of 1.
+
+        Args:
+            images: Input images
+
+        Returns:
+            Classification result (angle and confidence) for each image
+        """
+        if len(images) <= 1 or not self.supports_batch:
+            return [self.classify(image) for image in images]
+
+        preds = self.infer({'x': np.stack([self._preprocess_one(image) for image in images])})[0]
+        pred_idx = np.argmax(preds, axis=1)
+        pred_prob = np.max(preds, axis=1)
+        return [
+            {'angle': self.label_list[idx], 'confidence': float(prob)}
+            for idx, prob in zip(pred_idx, pred_prob)
+        ]
+
     def visualize(self, image: np.ndarray, result: Dict, output_path: str = None) -> np.ndarray:
         """
         Visualize classification result on image
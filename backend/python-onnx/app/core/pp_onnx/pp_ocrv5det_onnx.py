@@ -11,7 +11,7 @@ from typing import List, Dict, Tuple
 import yaml
 from shapely.geometry import Polygon
 
-from .onnx_model_base import ONNXModelBase
+from .onnx_model_base import ONNXModelBase, normalize_to_chw
 from ...config import get_model_path_from_registry
 
 
@@ -179,19 +179,15 @@ class PPOCRv5DetONNX(ONNXModelBase):
         # Use resized image directly (assuming model supports non-square input)
         final_image = resized
 
-        # Normalize using config values
-        normalized = final_image.astype(np.float32) / 255.0
-        normalized = (normalized - self.mean) / self.std
-
-        # Convert to CHW format
-        chw = np.transpose(normalized, (2, 0, 1))
+        # Normalize using config values, directly into CHW format
+        chw = normalize_to_chw(final_image, self.mean, self.std)
 
         # Add batch dimension
         batch_input = np.expand_dims(chw, 0)
 
         # Return inputs dict for ONNX model - PP-OCRv5 det expects 'x'
         inputs = {
-            'x': batch_input.astype(np.float32),  # [1, 3, H, W]
+            'x': batch_input,  # [1, 3, H, W]
         }
 
         # Return preprocessing metadata for postprocessing
@@ -213,7 +209,7 @@ class PPOCRv5DetONNX(ONNXModelBase):
         Returns:
             Raw model outputs
         """
-        return self.session.run(self.output_names, input_feed=inputs)
+        return self.infer(inputs)
 
     def postprocess(self, outputs: List[np.ndarray], preprocess_info: Dict[str, any], conf_threshold: float = 0.5, use_open: bool = False, use_close: bool = False, morph_kernel_size: int = 3) -> List[Dict]:
         """
@@ -257,20 +253,22 @@ class PPOCRv5DetONNX(ONNXModelBase):
             if width < 5 or height < 5:
                 continue
 
+            # Calculate confidence as mean probability in the region, using a
+            # mask limited to the contour's bounding rect instead of the whole map
+            cx, cy, cw, ch = cv2.boundingRect(contour)
+            mask = np.zeros((ch, cw), dtype=np.uint8)
+            cv2.drawContours(mask, [contour], -1, 1, -1, offset=(-cx, -cy))
+            confidence = float(np.mean(pred[cy:cy + ch, cx:cx + cw][mask > 0]))
+
+            if confidence < conf_threshold:
+                continue
+
             # Apply unclip expansion (like original PaddleOCR)
             expanded_points = self.unclip(points, self.unclip_ratio)
 
             # Get final bbox from expanded polygon
             x, y, w, h = cv2.boundingRect(expanded_points)
 
-            # Calculate confidence as mean probability in the region
-            mask = np.zeros_like(pred, dtype=np.uint8)
-            cv2.drawContours(mask, [contour], -1, 1, -1)
-            confidence = float(np.mean(pred[mask > 0]))
-
-            if confidence < conf_threshold:
-                continue
-
             # Map coordinates back to original image
             # The model outputs coordinates relative to the square canvas input
             # We placed the resized image at (0,0) on the canvas
@@ -3,6 +3,9 @@ Standalone PP-OCRv5 Recognition ONNX Inference
 Implements text recognition using PP-OCRv5 mobile rec ONNX model
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 import onnxruntime as ort
@@ -10,9 +13,26 @@ from pathlib import Path
 from typing import List, Dict, Tuple
 import yaml
 
-from .onnx_model_base import ONNXModelBase
+from .onnx_model_base import ONNXModelBase, normalize_to_chw, resolve_providers
 from ...config import get_model_path_from_registry
 
+# Dynamic quantization needs the onnx package, which is optional here
+try:
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    HAS_QUANTIZATION = True
+except ImportError:
+    HAS_QUANTIZATION = False
+
+# Use an int8 dynamically quantized copy of the recognition model (MatMul/Gemm
+# weights) for CPU-only sessions. The copy is written next to inference.onnx the
+# first time it is needed; without onnxruntime.quantization the float model is used.
+OCR_REC_INT8 = os.getenv("OCR_REC_INT8", "0").lower() in ("1", "true", "yes")
+INT8_MODEL_FILENAME = 'inference.int8.onnx'
+
+# Shared pool that resizes and normalizes the next recognition batch while the
+# current one is in session.run (ONNX Runtime, cv2 and numpy release the GIL)
+_prefetch_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="rec-prefetch")
+
 
 class PPOCRv5RecONNX(ONNXModelBase):
     def __init__(self, model_path: str = None, use_gpu: bool = False, gpu_id: int = 0):
@@ -59,6 +79,8 @@ class PPOCRv5RecONNX(ONNXModelBase):
 
         if not self.label_list:
             self.label_list = [' ']  # Default blank for CTC
+        # Index -> character lookup for CTC decoding, slot 0 is the blank
+        self._chars = np.array([''] + list(self.label_list), dtype=object)
 
         # Extract dynamic shape information for reference
         self.dynamic_shapes = {}
@@ -68,12 +90,42 @@ class PPOCRv5RecONNX(ONNXModelBase):
         elif 'tensorrt' in backend_configs and 'dynamic_shapes' in backend_configs['tensorrt']:
             self.dynamic_shapes = backend_configs['tensorrt']['dynamic_shapes']
 
+        onnx_path = self.model_path
+        if OCR_REC_INT8 and resolve_providers(use_gpu, gpu_id) == ['CPUExecutionProvider']:
+            onnx_path = self._int8_model_path() or onnx_path
+
         # Initialize ONNXModelBase
-        super().__init__(model_path=str(self.model_path), use_gpu=use_gpu, gpu_id=gpu_id)
+        super().__init__(model_path=str(onnx_path), use_gpu=use_gpu, gpu_id=gpu_id)
 
         print(f"Loaded {self.model_name} model with {len(self.label_list)} classes")
         # print(f"Classes: {self.label_list}")
 
+    def _int8_model_path(self):
+        """
+        Path of the int8 quantized model, creating it on first use
+
+        Returns:
+            Path to the quantized model, or None when it cannot be created
+        """
+        int8_path = self.model_path.with_name(INT8_MODEL_FILENAME)
+        if int8_path.exists() and int8_path.stat().st_mtime >= self.model_path.stat().st_mtime:
+            return int8_path
+        if not HAS_QUANTIZATION:
+            print("onnxruntime.quantization is not available (requires the onnx package), using the float model")
+            return None
+
+        # Quantize into a per-process temporary file, then move it into place
+        tmp_path = int8_path.with_name(f"{INT8_MODEL_FILENAME}.{os.getpid()}.tmp")
+        try:
+            quantize_dynamic(str(self.model_path), str(tmp_path), weight_type=QuantType.QInt8,
+                             op_types_to_quantize=['MatMul', 'Gemm'])
+            os.replace(tmp_path, int8_path)
+        except Exception as e:
+            print(f"Failed to quantize {self.model_path}: {e}, using the float model")
+            tmp_path.unlink(missing_ok=True)
+            return None
+        return int8_path
+
     def get_config_info(self) -> Dict:
         """
         Get configuration information loaded from yml file
@@ -108,41 +160,43 @@ class PPOCRv5RecONNX(ONNXModelBase):
             if image is None:
                 raise ValueError(f"Could not load image from {image}")
 
-        # Get original size
-        h, w = image.shape[:2]
+        chw = self._preprocess_one(image)
+
+        # Return inputs dict for ONNX model - PP-OCRv5 rec expects 'x'
+        inputs = {
+            'x': np.expand_dims(chw, 0),  # [1, 3, 48, W]
+        }
 
-        # Calculate target size maintaining aspect ratio
+        return inputs
+
+    def _target_width(self, image: np.ndarray) -> int:
+        """Width of a crop after resizing to the model height, keeping aspect ratio."""
+        h, w = image.shape[:2]
         target_h = 48
         target_w = int(w * (target_h / h))
-        
+
         # Limit max width to prevent excessive memory usage (from dynamic shapes max ~3200)
         max_w = 3200
         target_w = min(target_w, max_w)
-        
+
         # Ensure minimum width
         # min_w = 160
         min_w = target_h  # From dynamic shapes min
-        target_w = max(target_w, min_w)  # From dynamic shapes min
+        return max(target_w, min_w)  # From dynamic shapes min
 
+    def _preprocess_one(self, image: np.ndarray) -> np.ndarray:
+        """Resize and normalize one crop into a float32 CHW array of height 48."""
         # Resize to target size maintaining aspect ratio
-        resized = cv2.resize(image, (target_w, target_h))
-
-        # Normalize using config values (0.5 mean, 0.5 std)
-        normalized = resized.astype(np.float32) / 255.0
-        normalized = (normalized - self.mean) / self.std
+        resized = cv2.resize(image, (self._target_width(image), 48))
 
-        # Convert to CHW format
-        chw = np.transpose(normalized, (2, 0, 1))
+        # Normalize using config values (0.5 mean, 0.5 std), directly into CHW format
+        return normalize_to_chw(resized, self.mean, self.std)
 
-        # Add batch dimension
-        batch_input = np.expand_dims(chw, 0)
-
-        # Return inputs dict for ONNX model - PP-OCRv5 rec expects 'x'
-        inputs = {
-            'x': batch_input.astype(np.float32),  # [1, 3, 48, 320]
-        }
-
-        return inputs
+    @property
+    def supports_batch(self) -> bool:
+        """Whether the exported model accepts a dynamic batch size and width"""
+        shape = self.session.get_inputs()[0].shape
+        return (not isinstance(shape[0], int) or shape[0] != 1) and not isinstance(shape[3], int)
 
     def postprocess(self, outputs: List[np.ndarray], image: np.ndarray, original_size: Tuple[int, int], conf_threshold: float = 0.5) -> List[Dict]:
         """
@@ -170,33 +224,27 @@ class PPOCRv5RecONNX(ONNXModelBase):
             raise ValueError(f"Unexpected preds shape: {preds.shape}")
 
         # Decode for batch_idx 0
-        text_index = preds_idx[0]
-        text_prob = preds_prob[0]
+        return [self._ctc_decode(preds_idx[0], preds_prob[0])]
 
+    def _ctc_decode(self, text_index: np.ndarray, text_prob: np.ndarray) -> Dict:
+        """CTC-decode the predictions of one sample into text and mean confidence."""
         # CTC decoding: remove duplicates and blanks (0 is blank)
         selection = np.ones(len(text_index), dtype=bool)
         selection[1:] = text_index[1:] != text_index[:-1]  # Remove consecutive duplicates
         selection &= text_index != 0  # Remove blank (0)
+        selection &= text_index < len(self._chars)  # Valid character index
 
-        char_list = []
-        conf_list = []
-        for idx, prob in zip(text_index[selection], text_prob[selection]):
-            if 0 < idx < len(self.label_list) + 1:  # Valid character index (skip blank)
-                char_list.append(self.label_list[idx - 1])  # -1 because blank is 0
-                conf_list.append(prob)
-
-        if len(conf_list) == 0:
-            conf_list = [0]
-
-        recognized_text = "".join(char_list)
-        confidence = float(np.mean(conf_list))
+        # One fancy-index into the preloaded characters instead of a per-character loop
+        recognized_text = "".join(self._chars[text_index[selection]])
+        conf_list = text_prob[selection]
+        confidence = float(np.mean(conf_list)) if len(conf_list) else 0.0
 
         result = {
             'text': recognized_text,
             'confidence': confidence
         }
 
-        return [result]
+        return result
 
     def recognize(self, image: np.ndarray, conf_threshold: float = 0.5) -> Dict:
         """
@@ -218,6 +266,69 @@ class PPOCRv5RecONNX(ONNXModelBase):
         # Return the first result
         return results[0] if results else {'text': '', 'confidence': 0.0}
 
+    def recognize_batch(self, images: List[np.ndarray], conf_threshold: float = 0.5, batch_size: int = 8) -> List[Dict]:
+        """
+        Run text recognition on many crops with batched inference
+
+        Crops are sorted by width after resizing to the model height and
+        grouped into batches of ``batch_size``, so each batch holds crops of
+        similar width. Narrower crops are zero-padded on the right (the
+        normalized mid-gray value) up to the widest crop in their batch. Two
+        input buffers sized for the widest batch are allocated up front and
+        used in turn: while one batch is in session.run, the crops of the
+        next one are resized and normalized straight into the other buffer
+        in the background. Falls back to per-crop recognition when the model
+        has a fixed batch size or width.
+
+        Args:
+            images: Cropped text images
+            conf_threshold: Confidence threshold for recognition
+            batch_size: Maximum number of crops per inference call
+
+        Returns:
+            Recognition results in the same order as ``images``
+        """
+        if len(images) <= 1 or batch_size <= 1 or not self.supports_batch:
+            return [self.recognize(image, conf_threshold=conf_threshold) for image in images]
+
+        results: List[Dict] = [None] * len(images)
+        widths = [self._target_width(image) for image in images]
+        order = sorted(range(len(images)), key=widths.__getitem__)
+        # Batches are filled in ascending width, so the last one is the widest
+        buffer_size = min(batch_size, len(images)) * 3 * 48 * widths[order[-1]]
+        buffers = (np.empty(buffer_size, dtype=np.float32), np.empty(buffer_size, dtype=np.float32))
+        batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+        def prepare(batch_idx):
+            indices = batches[batch_idx]
+            max_w = widths[indices[-1]]
+            # Contiguous view over the head of this batch's buffer
+            batch = buffers[batch_idx % 2][:len(indices) * 3 * 48 * max_w].reshape(len(indices), 3, 48, max_w)
+            for row, i in enumerate(indices):
+                # Resize straight from the crop view, normalize straight into the batch row
+                resized = cv2.resize(images[i], (widths[i], 48))
+                normalize_to_chw(resized, self.mean, self.std, out=batch[row, :, :, :widths[i]])
+                batch[row, :, :, widths[i]:] = 0
+            return batch
+
+        pending = None
+        for batch_idx, indices in enumerate(batches):
+            batch = pending.result() if pending is not None else prepare(batch_idx)
+            pending = None
+            if batch_idx + 1 < len(batches):
+                pending = _prefetch_executor.submit(prepare, batch_idx + 1)
+
+            preds = self.infer({'x': batch})[0]
+            if preds.ndim == 3:
+                preds_idx = preds.argmax(axis=2)
+                preds_prob = preds.max(axis=2)
+            else:
+                preds_idx = preds
+                preds_prob = np.ones_like(preds, dtype=float)
+            for row, i in enumerate(indices):
+                results[i] = self._ctc_decode(preds_idx[row], preds_prob[row])
+        return results
+
     def visualize(self, image: np.ndarray, result: Dict, output_path: str = None) -> np.ndarray:
         """
         Visualize recognized text on image
@@ -3,6 +3,7 @@ PP-OCRv5 Complete Pipeline ONNX Inference
 Integrates document orientation detection, text detection, and text recognition
 """
 
+import os
 import cv2
 import numpy as np
 from pathlib import Path
@@ -12,6 +13,14 @@ import yaml
 from ..pp_onnx.pp_ocrv5det_onnx import PPOCRv5DetONNX
 from ..pp_onnx.pp_ocrv5rec_onnx import PPOCRv5RecONNX
 from ..pp_onnx.pp_lcnet_doc_onnx import PPLCNetDocONNX
+from ..utils import rotate_by_angle
+
+# Number of text crops recognized per inference call (1 disables batching)
+REC_BATCH_SIZE = int(os.getenv("OCR_REC_BATCH_SIZE", "8"))
+
+# Detections narrower or shorter than this (in pixels, e.g. boxes clipped at the
+# image border) cannot hold legible text and are dropped before recognition
+REC_MIN_BOX_SIZE = int(os.getenv("OCR_REC_MIN_BOX_SIZE", "3"))
 
 
 class PPOCRv5Pipeline:
@@ -143,32 +152,33 @@ class PPOCRv5Pipeline:
             rotation_confidence = 1.0
         
         # Step 2: Rotate image based on detected angle
-        if angle == 90:
-            rotated_image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        elif angle == 180:
-            rotated_image = cv2.rotate(image, cv2.ROTATE_180)
-        elif angle == 270:
-            rotated_image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
-        else:
-            rotated_image = image.copy()
+        # No copy when unrotated: detection and cropping only read the image
+        rotated_image = rotate_by_angle(image, angle)
         
         # Step 3: Text detection on rotated image
         detections = self.det_model.detect(rotated_image, conf_threshold=conf_threshold, use_close=use_close)
         
-        # Step 4: Text recognition for each detected region
-        results = []
+        # Step 4: Crop every detected region, then recognize all crops in width-sorted batches
+        kept_detections = []
+        crops = []
         for det in detections:
-            bbox = det['bbox']
-            x1, y1, x2, y2 = bbox
+            x1, y1, x2, y2 = det['bbox']
+            if x2 - x1 < REC_MIN_BOX_SIZE or y2 - y1 < REC_MIN_BOX_SIZE:
+                continue
             
             # Crop text region
             cropped = rotated_image[y1:y2, x1:x2]
             if cropped.size == 0:
                 continue
-            
-            # Recognize text
-            rec_result = self.rec_model.recognize(cropped, conf_threshold=conf_threshold)
-            
+            kept_detections.append(det)
+            crops.append(cropped)
+
+        rec_results = self.rec_model.recognize_batch(crops, conf_threshold=conf_threshold, batch_size=REC_BATCH_SIZE)
+
+        results = []
+        for det, rec_result in zip(kept_detections, rec_results):
+            bbox = det['bbox']
+
             # Combine results
             result = {
                 'text': rec_result['text'],
@@ -186,6 +196,28 @@ class PPOCRv5Pipeline:
         
         return results
 
+    def estimate_text_height(self, image: np.ndarray, conf_threshold: float = 0.5) -> Optional[float]:
+        """
+        Estimate the typical text line height of an image using text detection only
+        
+        Args:
+            image: Input image (usually a low resolution preview)
+            conf_threshold: Confidence threshold for detection
+            
+        Returns:
+            Median height of the detected text boxes in pixels, or None if no text is found
+        """
+        if not self.is_loaded():
+            success, error_msg = self.load()
+            if not success:
+                raise RuntimeError(f"Failed to auto-load PP-OCRv5 models: {error_msg}")
+        
+        detections = self.det_model.detect(image, conf_threshold=conf_threshold)
+        if not detections:
+            return None
+        heights = [det['bbox'][3] - det['bbox'][1] for det in detections]
+        return float(np.median(heights))
+
     def merge_overlapping_boxes(self, results: List[Dict], overlap_threshold: float = 0.9) -> List[Dict]:
         """
         Merge overlapping text detection boxes based on overlap ratio.
@@ -330,7 +362,7 @@ class PPOCRv5Pipeline:
                 hasattr(self, 'det_model') and self.det_model is not None and
                 hasattr(self, 'rec_model') and self.rec_model is not None)
 
-    def visualize(self, image: np.ndarray, results: List[Dict], output_path: str = None, cls_thresh: float = 0.9, use_cls: bool = True) -> np.ndarray:
+    def visualize(self, image: np.ndarray, results: List[Dict], output_path: str = None, cls_thresh: float = 0.9, use_cls: bool = True, out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Visualize OCR results on image
         
@@ -340,6 +372,9 @@ class PPOCRv5Pipeline:
             output_path: Path to save visualization (optional)
             cls_thresh: Confidence threshold for classification
             use_cls: Whether to use document orientation classification
+            out: Buffer to draw on when the image is not rotated (pass ``image``
+                itself to draw in place when the original is no longer needed).
+                By default the image is copied once.
             
         Returns:
             Image with OCR results drawn
@@ -361,14 +396,15 @@ class PPOCRv5Pipeline:
         else:
             angle = 0
         
-        if angle == 90:
-            vis_image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        elif angle == 180:
-            vis_image = cv2.rotate(image, cv2.ROTATE_180)
-        elif angle == 270:
-            vis_image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
-        else:
+        # Rotation already produces a new image to draw on
+        if angle in (90, 180, 270):
+            vis_image = rotate_by_angle(image, angle)
+        elif out is None:
             vis_image = image.copy()
+        else:
+            if out is not image:
+                np.copyto(out, image)
+            vis_image = out
         
         # Draw results
         for result in results:
@@ -448,11 +484,11 @@ def main():
     for i, result in enumerate(results):
         print(f"  Region {i}: '{result['text']}' (conf: {result['confidence']:.2f})")
     
-    # Visualize
+    # Visualize (the input is not needed afterwards, draw on it directly)
     if output_path:
-        vis_image = pipeline.visualize(image, results, output_path)
+        vis_image = pipeline.visualize(image, results, output_path, out=image)
     else:
-        vis_image = pipeline.visualize(image, results)
+        vis_image = pipeline.visualize(image, results, out=image)
         cv2.imshow("PP-OCRv5 Pipeline Results", vis_image)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
@@ -10,9 +10,13 @@ from pathlib import Path
 import cv2
 import numpy as np
 import base64
+import logging
 
 from ..pp_onnx.pp_doclayout_onnx import PPDocLayoutONNX
 from .pp_ocrv5_pipeline import PPOCRv5Pipeline
+from ..utils import rotate_by_angle
+
+logger = logging.getLogger(__name__)
 
 
 class PPStructureV3Pipeline:
@@ -65,7 +69,7 @@ class PPStructureV3Pipeline:
                     config_available = False
             except ImportError:
                 config_available = False
-                print("Warning: Could not import config, using None for model paths")
+                logger.warning("Could not import config, using None for model paths")
         
         # 验证必需的模型路径
         missing_required = []
@@ -150,7 +154,7 @@ class PPStructureV3Pipeline:
                 for missing in missing_models:
                     error_msg += f"  - {missing}\n"
                 error_msg += "\n需要下载的模型：PP-DocLayout-L, PP-OCRv5_mobile_det, PP-OCRv5_mobile_rec, PP-LCNet_x1_0_textline_ori"
-                print("Error: " + error_msg)
+                logger.error(error_msg)
                 return False, error_msg
 
             # 初始化布局检测模型
@@ -170,7 +174,7 @@ class PPStructureV3Pipeline:
             return True, ""
         except Exception as e:
             error_msg = f"加载PP-StructureV3模型失败: {e}"
-            print(f"Failed to load PP-StructureV3 models: {e}")
+            logger.error("Failed to load PP-StructureV3 models: %s", e)
             self.unload()  # 清理部分加载的模型
             return False, error_msg
 
@@ -193,7 +197,7 @@ class PPStructureV3Pipeline:
             self._loaded = False
             return True
         except Exception as e:
-            print(f"Failed to unload PP-StructureV3 models: {e}")
+            logger.error("Failed to unload PP-StructureV3 models: %s", e)
             return False
 
     def is_loaded(self) -> bool:
@@ -323,7 +327,7 @@ class PPStructureV3Pipeline:
             Dict[str, Any]: 分析结果
         """
         if not self._loaded:
-            print("Models not loaded, auto-loading...")
+            logger.info("Models not loaded, auto-loading...")
             success, error_msg = self.load()
             if not success:
                 raise RuntimeError(f"Failed to auto-load models: {error_msg}")
@@ -334,6 +338,86 @@ class PPStructureV3Pipeline:
             if image is None:
                 raise ValueError(f"Failed to load image from {image}")
 
+        angle, rotation_confidence, rotated_image = self._orient_image(image, use_cls, cls_thresh)
+
+        # # 创建输出目录用于保存裁剪的图像片段
+        # import os
+        # from datetime import datetime
+        # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # output_dir = f"debug_crops_{timestamp}"
+        # os.makedirs(output_dir, exist_ok=True)
+        # print(f"Saving cropped regions to: {output_dir}")
+
+        # region_counter = 0
+
+        # 步骤2: 布局检测
+        layout_regions = self.layout_model.detect(
+            rotated_image,
+            conf_threshold=layout_conf_threshold
+        )
+
+        return self._analyze_regions(
+            image, rotated_image, angle, rotation_confidence, layout_regions,
+            ocr_conf_threshold=ocr_conf_threshold, unclip_ratio=unclip_ratio, **kwargs
+        )
+
+    def analyze_structure_batch(
+        self,
+        images: List[np.ndarray],
+        layout_conf_threshold: float = 0.5,
+        layout_iou_threshold: float = 0.5,
+        ocr_conf_threshold: float = 0.5,
+        unclip_ratio: float = 1.1,
+        use_cls: bool = True,
+        cls_thresh: float = 0.9,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        对多张图像执行文档结构分析，布局检测合并为一次批量推理
+
+        参数含义与 analyze_structure 相同，返回结果与逐张调用 analyze_structure 一致。
+
+        Args:
+            images: 输入图像（numpy数组）列表
+
+        Returns:
+            List[Dict[str, Any]]: 每张图像的分析结果
+        """
+        if not self._loaded:
+            logger.info("Models not loaded, auto-loading...")
+            success, error_msg = self.load()
+            if not success:
+                raise RuntimeError(f"Failed to auto-load models: {error_msg}")
+
+        # 文档方向分类输入尺寸固定，同样合并为一次批量推理
+        cls_results = self.ocr_pipeline.cls_model.classify_batch(images) if use_cls else [None] * len(images)
+        oriented = [
+            self._orient_image(image, use_cls, cls_thresh, cls_result=cls_result)
+            for image, cls_result in zip(images, cls_results)
+        ]
+
+        # 布局模型输入尺寸固定，多张图像可以拼成一个批次一次推理
+        all_layout_regions = self.layout_model.detect_batch(
+            [rotated_image for _, _, rotated_image in oriented],
+            conf_threshold=layout_conf_threshold
+        )
+
+        return [
+            self._analyze_regions(
+                image, rotated_image, angle, rotation_confidence, layout_regions,
+                ocr_conf_threshold=ocr_conf_threshold, unclip_ratio=unclip_ratio, **kwargs
+            )
+            for image, (angle, rotation_confidence, rotated_image), layout_regions
+            in zip(images, oriented, all_layout_regions)
+        ]
+
+    def _orient_image(self, image: np.ndarray, use_cls: bool, cls_thresh: float, cls_result: Optional[Dict[str, Any]] = None) -> Tuple[int, float, np.ndarray]:
+        """
+        文档方向检测并旋转图像（cls_result为已批量得到的方向分类结果时不再单独推理）
+
+        Returns:
+            (angle, rotation_confidence, rotated_image)
+        """
         # 步骤0: 文档方向检测（可选）
         # 注意：这里复用了PPOCRv5Pipeline中已创建的方向检测模型(cls_model)
         # 这种设计基于效率考虑，避免重复加载相同的方向检测模型
@@ -342,7 +426,8 @@ class PPStructureV3Pipeline:
         angle = 0
         rotation_confidence = 1.0
         if use_cls:
-            cls_result = self.ocr_pipeline.cls_model.classify(image)
+            if cls_result is None:
+                cls_result = self.ocr_pipeline.cls_model.classify(image)
             if cls_result['confidence'] >= cls_thresh:
                 angle = int(cls_result['angle'])
                 rotation_confidence = cls_result['confidence']
@@ -356,31 +441,23 @@ class PPStructureV3Pipeline:
             rotation_confidence = 1.0
 
         # 步骤1: 根据检测到的角度旋转图像
-        if angle == 90:
-            rotated_image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        elif angle == 180:
-            rotated_image = cv2.rotate(image, cv2.ROTATE_180)
-        elif angle == 270:
-            rotated_image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
-        else:
-            rotated_image = image.copy()
-
-        # # 创建输出目录用于保存裁剪的图像片段
-        # import os
-        # from datetime import datetime
-        # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # output_dir = f"debug_crops_{timestamp}"
-        # os.makedirs(output_dir, exist_ok=True)
-        # print(f"Saving cropped regions to: {output_dir}")
+        # 未旋转时直接使用原图（后续步骤只读取图像，无需拷贝）
+        rotated_image = rotate_by_angle(image, angle)
 
-        # region_counter = 0
-
-        # 步骤2: 布局检测
-        layout_regions = self.layout_model.detect(
-            rotated_image,
-            conf_threshold=layout_conf_threshold
-        )
+        return angle, rotation_confidence, rotated_image
 
+    def _analyze_regions(
+        self,
+        image: np.ndarray,
+        rotated_image: np.ndarray,
+        angle: int,
+        rotation_confidence: float,
+        layout_regions: List[Dict],
+        ocr_conf_threshold: float = 0.5,
+        unclip_ratio: float = 1.1,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """根据布局检测结果对各区域进行OCR等处理，组装分析结果"""
         # 可选：合并重叠的布局区域（仅当类型相同时）
         merge_layout = kwargs.get('merge_layout', False)
         layout_overlap_threshold = kwargs.get('layout_overlap_threshold', 0.5)
@@ -399,8 +476,16 @@ class PPStructureV3Pipeline:
             'figure_regions': []
         }
 
+        # 应用unclip_ratio扩大裁剪区域 (默认1.1倍，接口传入的unclip_ratio同样生效)，所有区域的裁剪框一次性算出
+        crop_boxes = None
+        if unclip_ratio > 1.0 and layout_regions:
+            crop_boxes = self._unclip_bboxes(
+                [region.get('bbox') if len(region.get('bbox') or []) == 4 else [0, 0, 0, 0] for region in layout_regions],
+                unclip_ratio, rotated_image.shape
+            ).tolist()
+
         # 步骤2: 对每个区域进行相应处理
-        for region in layout_regions:
+        for region_idx, region in enumerate(layout_regions):
             region_type = region.get('type', '')
             bbox = region.get('bbox', [])
 
@@ -409,27 +494,11 @@ class PPStructureV3Pipeline:
 
             x1, y1, x2, y2 = bbox
 
-            # 应用unclip_ratio扩大裁剪区域 (默认1.1倍)
-            unclip_ratio = kwargs.get('unclip_ratio', 1.1)
-            if unclip_ratio > 1.0:
-                # Convert bbox to polygon points (clockwise order)
-                box_points = np.array([
-                    [x1, y1],  # top-left
-                    [x2, y1],  # top-right
-                    [x2, y2],  # bottom-right
-                    [x1, y2]   # bottom-left
-                ], dtype=np.float32)
-
-                # Apply unclip expansion
-                expanded_points = self._unclip_polygon(box_points, unclip_ratio)
-
-                # Get bounding box of expanded polygon
-                crop_x1 = max(0, int(np.min(expanded_points[:, 0])))
-                crop_y1 = max(0, int(np.min(expanded_points[:, 1])))
-                crop_x2 = min(rotated_image.shape[1], int(np.max(expanded_points[:, 0])))
-                crop_y2 = min(rotated_image.shape[0], int(np.max(expanded_points[:, 1])))
-
-                print(f"Unclip applied: {bbox} -> polygon expansion -> [{crop_x1}, {crop_y1}, {crop_x2}, {crop_y2}] (ratio: {unclip_ratio})")
+            if crop_boxes is not None:
+                crop_x1, crop_y1, crop_x2, crop_y2 = crop_boxes[region_idx]
+
+                logger.debug("Unclip applied: %s -> polygon expansion -> [%d, %d, %d, %d] (ratio: %s)",
+                             bbox, crop_x1, crop_y1, crop_x2, crop_y2, unclip_ratio)
             else:
                 crop_x1, crop_y1, crop_x2, crop_y2 = x1, y1, x2, y2
 
@@ -540,7 +609,7 @@ class PPStructureV3Pipeline:
             }
 
         except Exception as e:
-            print(f"OCR processing error: {e}")
+            logger.warning("OCR processing error: %s", e)
             return None
 
     def _process_table_region(self, image: np.ndarray) -> Optional[Dict[str, Any]]:
@@ -577,21 +646,22 @@ class PPStructureV3Pipeline:
             'text': 'E = mc^2'
         }
 
-    def visualize(self, image: np.ndarray, regions: List[Dict[str, Any]]) -> np.ndarray:
+    def visualize(self, image: np.ndarray, regions: List[Dict[str, Any]], to_bgr: bool = False) -> np.ndarray:
         """
         可视化文档结构分析结果
 
         Args:
             image: 原始图像
             regions: 布局区域列表
+            to_bgr: 为True时输入视为RGB图像，返回BGR格式的可视化结果（可直接交给OpenCV编码）
 
         Returns:
             np.ndarray: 可视化后的图像
         """
         # 使用布局模型的可视化
-        return self.layout_model.visualize(image, regions)
+        return self.layout_model.visualize(image, regions, to_bgr=to_bgr)
 
-    def result_to_markdown(self, image: np.ndarray, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    def result_to_markdown(self, image: np.ndarray, analysis_result: Dict[str, Any], crop_scale: float = 1.0) -> Dict[str, Any]:
         """
         将文档分析结果转换为接近源文档结构的 Markdown 文档。
         返回markdown内容和图片文件列表。
@@ -599,25 +669,16 @@ class PPStructureV3Pipeline:
         Args:
             image: 原始图像（numpy array）
             analysis_result: analyze_structure返回的完整结果字典
+            crop_scale: 分析结果坐标到image的缩放比例（image以高于分析时的分辨率渲染、用于裁剪更清晰的图片时使用）
 
         Returns:
             Dict[str, Any]: 包含 'markdown' 和 'images' 键的字典
         """
-        # 根据旋转信息处理图像
+        # 直接使用分析结果中的区域和识别内容，不再重新分析；图像只用于裁剪图片区域（只读，无需拷贝）
         rotation = analysis_result.get('rotation', 0)
-        if rotation == 90:
-            working_image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        elif rotation == 180:
-            working_image = cv2.rotate(image, cv2.ROTATE_180)
-        elif rotation == 270:
-            working_image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
-        else:
-            working_image = image.copy()
-        
-        print(f"result_to_markdown called with image shape: {image.shape}")
-        if rotation != 0:
-            print(f"Using rotated image with shape: {working_image.shape} (rotation: {rotation}°)")
-        print(f"analysis_result keys: {list(analysis_result.keys())}")
+        working_image = rotate_by_angle(image, rotation)
+
+        logger.debug("result_to_markdown called with image shape: %s (rotation: %s°)", working_image.shape, rotation)
 
         markdown_parts = []
         images = []  # 存储图片数据
@@ -629,9 +690,7 @@ class PPStructureV3Pipeline:
         all_regions.extend(analysis_result.get('formula_regions', []))
         all_regions.extend(analysis_result.get('figure_regions', []))
 
-        print(f"Total regions to process: {len(all_regions)}")
-        for i, region in enumerate(all_regions[:3]):  # 只打印前3个
-            print(f"Region {i}: type={region.get('type')}, bbox={region.get('bbox')}")
+        logger.debug("Total regions to process: %d", len(all_regions))
 
         # Sort by reading order: top->down, left->right
         try:
@@ -731,7 +790,7 @@ class PPStructureV3Pipeline:
                 try:
                     bbox = region.get('bbox', [])
                     if len(bbox) >= 4:
-                        x1, y1, x2, y2 = map(int, bbox[:4])
+                        x1, y1, x2, y2 = (int(v * crop_scale) for v in bbox[:4])
                         x1, y1 = max(0, x1), max(0, y1)
                         x2, y2 = min(working_image.shape[1], x2), min(working_image.shape[0], y2)
                         if x2 > x1 and y2 > y1:
@@ -740,10 +799,9 @@ class PPStructureV3Pipeline:
                             if s:
                                 # 生成唯一的图片文件名
                                 image_filename = f"figure_{len(images) + 1}.png"
-                                image_data = enc.tobytes()
-                                
                                 # 将图片数据转换为base64编码的字符串，以便JSON序列化
-                                base64_data = base64.b64encode(image_data).decode('utf-8')
+                                # （b64encode直接读取编码结果数组的缓冲区，无需先拷贝为bytes；base64结果为纯ASCII）
+                                base64_data = base64.b64encode(enc).decode('ascii')
                                 
                                 # 存储图片数据
                                 images.append({
@@ -753,7 +811,7 @@ class PPStructureV3Pipeline:
                                 
                                 # 在markdown中引用图片
                                 markdown_parts.append(f"![Figure](images/{image_filename})\n\n")
-                                print(f"Added figure to markdown: {image_filename}, bbox={bbox}, image size={crop.shape}")
+                                logger.debug("Added figure to markdown: %s, bbox=%s, image size=%s", image_filename, bbox, crop.shape)
                             else:
                                 markdown_parts.append("*Image encoding failed*\n\n")
                         else:
@@ -761,7 +819,7 @@ class PPStructureV3Pipeline:
                     else:
                         markdown_parts.append("*No image data*\n\n")
                 except Exception as e:
-                    print(f"Error processing figure: {e}")
+                    logger.warning("Error processing figure: %s", e)
                     markdown_parts.append(f"*Image processing error: {e}*\n\n")
 
         return {
@@ -769,6 +827,41 @@ class PPStructureV3Pipeline:
             'images': images
         }
 
+    def _unclip_bboxes(self, bboxes: List[List[float]], unclip_ratio: float, image_shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Expand many axis-aligned boxes at once, the way _unclip_polygon does for one
+
+        Offsetting a rectangle outwards by distance d = area * unclip_ratio / perimeter
+        (PaddleOCR's unclip) grows its bounding box by exactly d on every side, so the
+        crop boxes follow from a few array operations instead of one shapely buffer per
+        region. Degenerate boxes (zero area) are left unchanged, as with the polygon path.
+
+        Args:
+            bboxes: Boxes as [x1, y1, x2, y2]
+            unclip_ratio: Expansion ratio
+            image_shape: Shape of the image the crops are taken from
+
+        Returns:
+            Integer crop boxes (Nx4), clamped to the image
+        """
+        boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        lo = np.minimum(boxes[:, :2], boxes[:, 2:])
+        hi = np.maximum(boxes[:, :2], boxes[:, 2:])
+        size = hi - lo
+        area = size[:, 0] * size[:, 1]
+        perimeter = 2 * (size[:, 0] + size[:, 1])
+        distance = np.zeros(len(boxes))
+        np.divide(area * unclip_ratio, perimeter, out=distance, where=area > 0)
+
+        # Same float32 rounding and truncation towards zero as the polygon path
+        lo = (lo - distance[:, None]).astype(np.float32).astype(np.int64)
+        hi = (hi + distance[:, None]).astype(np.float32).astype(np.int64)
+        crops = np.empty((len(boxes), 4), dtype=np.int64)
+        crops[:, :2] = np.maximum(lo, 0)
+        crops[:, 2] = np.minimum(hi[:, 0], image_shape[1])
+        crops[:, 3] = np.minimum(hi[:, 1], image_shape[0])
+        return crops
+
     def _unclip_polygon(self, box_points: np.ndarray, unclip_ratio: float) -> np.ndarray:
         """
         Expand polygon using similar approach to PaddleOCR's unclip
@@ -784,7 +877,7 @@ class PPStructureV3Pipeline:
             from shapely.geometry import Polygon
         except ImportError:
             # Fallback to simple bbox expansion if shapely not available
-            print("Warning: shapely not available, using simple bbox expansion")
+            logger.warning("shapely not available, using simple bbox expansion")
             x_coords = box_points[:, 0]
             y_coords = box_points[:, 1]
             x1, x2 = np.min(x_coords), np.max(x_coords)
@@ -1,15 +1,43 @@
+import io
+import json
+import os
 import numpy as np
 import cv2
 import argparse
 import math
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
+from fastapi.responses import JSONResponse
 from ..config import get_work_dir
 
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# 识别和分析结果包含大量嵌套的坐标和分数，优先使用orjson序列化响应
+DefaultResponse = ORJSONResponse if HAS_ORJSON else JSONResponse
+
 # 获取当前文件所在的目录
 module_dir = Path(__file__).resolve().parent
 
 
+# 文档方向角度到cv2.rotate旋转码的映射（按检测到的角度将图像转正）
+ROTATE_CODES = {
+    90: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_CLOCKWISE,
+}
+
+
+def rotate_by_angle(img, angle):
+    """按文档方向角度旋转图像；角度为0时直接返回原图，不做拷贝"""
+    code = ROTATE_CODES.get(angle)
+    return img if code is None else cv2.rotate(img, code)
+
+
 def get_rotate_crop_image(img, points):
     assert len(points) == 4, "shape of points must be 4*2"
     img_crop_width = int(
@@ -68,7 +96,7 @@ def get_minarea_rect_crop(img, points):
 
 
 def resize_img(img, input_size=600):
-    img = np.array(img)
+    img = np.asarray(img)
     im_shape = img.shape
     im_size_max = np.max(im_shape[0:2])
     im_scale = float(input_size) / float(im_size_max)
@@ -167,7 +195,15 @@ def draw_ocr(
     scores=None,
     drop_score=0.5,
     font_path=str(module_dir / "fonts/simfang.ttf"),
+    out=None,
 ):
+    # 所有框都在同一张画布上原地绘制；out 为 None 时只复制一次输入图像，
+    # 调用方不再需要原图时可传入 out=image 直接在原图上绘制
+    if out is None:
+        out = np.array(image)
+    elif out is not image:
+        np.copyto(out, image)
+    image = out
     if scores is None:
         scores = [1] * len(boxes)
     box_num = len(boxes)
@@ -185,9 +221,9 @@ def draw_ocr(
         else:
             # 其他格式，使用原来的方法
             box = np.reshape(box_array, [-1, 1, 2]).astype(np.int64)
-        image = cv2.polylines(np.array(image), [box], True, (255, 0, 0), 2)
+        cv2.polylines(image, [box], True, (255, 0, 0), 2)
     if txts is not None:
-        img = np.array(resize_img(image, input_size=600))
+        img = resize_img(image, input_size=600)
         txt_img = text_visual(
             txts,
             scores,
@@ -196,11 +232,118 @@ def draw_ocr(
             threshold=drop_score,
             font_path=font_path,
         )
-        img = np.concatenate([np.array(img), np.array(txt_img)], axis=1)
+        img = np.concatenate([img, np.asarray(txt_img)], axis=1)
         return img
     return image
 
 
+def decode_image(contents):
+    """
+    将图片字节解码为RGB格式的numpy图像
+
+    优先使用OpenCV解码（比PIL解码+转换+拷贝更快），与PIL行为保持一致不应用EXIF方向；
+    OpenCV无法解码的格式回退到PIL，此时返回的数组直接引用PIL导出的数据（只读，不再额外拷贝）。
+    """
+    img = cv2.imdecode(np.frombuffer(contents, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        pil_img = Image.open(io.BytesIO(contents))
+        if pil_img.mode != "RGB":
+            pil_img = pil_img.convert("RGB")
+        return np.asarray(pil_img)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+# 绘制结果PNG压缩级别：叠加图以速度优先，1级比默认级别快数倍
+PNG_COMPRESSION_LEVEL = 1
+
+# 绘制结果支持的输出格式；JPEG编码更快、体积更小，但有损
+DRAW_MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+JPEG_QUALITY = 85
+
+
+def normalize_image_format(out_format):
+    """规范化输出格式名称（jpg视为jpeg），不支持的格式返回None"""
+    out_format = (out_format or "png").lower()
+    if out_format == "jpg":
+        out_format = "jpeg"
+    return out_format if out_format in DRAW_MEDIA_TYPES else None
+
+
+def encode_image(img, out_format="png", bgr=False):
+    """将RGB格式的numpy图像编码为PNG或JPEG字节（bgr为True时输入已是BGR格式，跳过颜色转换）"""
+    if not bgr:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    if out_format == "jpeg":
+        ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    else:
+        ok, encoded = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION_LEVEL])
+    if not ok:
+        raise RuntimeError(f"{out_format.upper()}编码失败")
+    return encoded.tobytes()
+
+
+def read_file_buffer(fileobj):
+    """
+    将文件对象的全部内容读入预分配的bytearray
+
+    通过readinto直接写入缓冲区，避免read()产生的中间bytes对象及其拷贝；
+    返回值支持缓冲区协议，可直接用于np.frombuffer、哈希计算和fitz打开PDF。
+    """
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    read = 0
+    while read < size:
+        n = fileobj.readinto(view[read:])
+        if not n:
+            break
+        read += n
+    view.release()
+    if read < size:
+        del buffer[read:]
+    return buffer
+
+def json_loads(data):
+    """解析JSON字符串，优先使用orjson"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj):
+    """将对象序列化为JSON字节，优先使用orjson"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def json_dumps_sorted(obj):
+    """将对象序列化为键有序的JSON字节（用于生成缓存键），优先使用orjson"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True).encode("utf-8")
+
+
+# 上传文件大小上限（MB），可通过环境变量 MAX_UPLOAD_MB 配置；OCR和PP-Structure接口共用
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+
+def upload_too_large(file):
+    """检查上传文件是否超过大小上限（上传文件已由框架缓存到临时文件，无需读入内存）"""
+    size = file.size
+    if size is None:
+        file.file.seek(0, io.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
+    return size > MAX_UPLOAD_BYTES
+
+
+def upload_too_large_response():
+    """上传文件超过大小上限时返回的413响应"""
+    return JSONResponse(status_code=413, content={"error": f"上传文件过大，最大支持{MAX_UPLOAD_BYTES // (1024 * 1024)}MB"})
+
 def base64_to_cv2(b64str):
     import base64
 
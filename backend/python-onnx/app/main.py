@@ -1,13 +1,33 @@
+import os
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from .router.health import router as health_router
-from .router.ppocr import router as ocr_router
-from .router.ppstructure import router as ppstructure_router
+from .router.ppocr import router as ocr_router, warmup_pipeline as warmup_ocr_pipeline
+from .router.ppstructure import router as ppstructure_router, warmup_pipeline as warmup_structure_pipeline
 from .router.models import router as models_router
+from .core.utils import DefaultResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：启动时按环境变量在后台预热模型
+
+    设置 OCR_WARMUP_ON_STARTUP=1 / STRUCTURE_WARMUP_ON_STARTUP=1 时在后台预加载对应模型，首个请求无需等待模型加载。
+    PP-StructureV3预热期间的分析请求会快速返回503。
+    """
+    if os.environ.get("OCR_WARMUP_ON_STARTUP", "0").lower() in ("1", "true", "yes"):
+        threading.Thread(target=warmup_ocr_pipeline, daemon=True).start()
+    if os.environ.get("STRUCTURE_WARMUP_ON_STARTUP", "0").lower() in ("1", "true", "yes"):
+        threading.Thread(target=warmup_structure_pipeline, daemon=True).start()
+    yield
 
 
-app = FastAPI(title="PaddleOCR ONNX API")
+app = FastAPI(title="PaddleOCR ONNX API", default_response_class=DefaultResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
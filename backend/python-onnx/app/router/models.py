@@ -1,8 +1,18 @@
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any
+import asyncio
 import os
+import shutil
 from ..config import MODEL_REGISTRY, get_work_dir
+from ..core.pp_onnx.onnx_model_base import prebuild_optimized_model
+from .ppocr import _invalidate_models_exist as _invalidate_ocr_models_exist
+from .ppstructure import _invalidate_models_exist as _invalidate_structure_models_exist
+
+# 批量下载时同时下载的模型数
+MODEL_DOWNLOAD_WORKERS = int(os.getenv("MODEL_DOWNLOAD_WORKERS", "4"))
 
 def get_directory_size(path: Path) -> int:
     """
@@ -21,6 +31,11 @@ def get_directory_size(path: Path) -> int:
         pass
     return 0
 
+def _invalidate_model_status():
+    """模型文件下载或删除后，清除各识别接口缓存的模型完整性检查结果"""
+    _invalidate_ocr_models_exist()
+    _invalidate_structure_models_exist()
+
 router = APIRouter()
 
 @router.get("/list")
@@ -50,6 +65,73 @@ async def list_models() -> List[Dict[str, Any]]:
 
     return models
 
+def _download_model_files(model_name: str, config: Dict[str, Any]) -> None:
+    """
+    从ModelScope下载模型并复制到本地路径（阻塞调用，在线程中执行）
+    """
+    work_dir = Path(get_work_dir())
+    local_path = work_dir / config["local_path"]
+
+    # 确保父目录存在
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 使用ModelScope下载
+    from modelscope import snapshot_download
+    print(f"Downloading from ModelScope: {config['modelscope_id']}...")
+
+    # 下载到临时目录（相对于work_dir），每个模型单独一个子目录，并发下载时互不影响
+    temp_root = work_dir / "temp"
+    temp_cache_dir = temp_root / model_name
+    temp_dir = snapshot_download(
+        config["modelscope_id"],
+        cache_dir=str(temp_cache_dir)
+    )
+
+    temp_model_dir = Path(temp_dir)
+
+    # 检查local_path是文件还是目录
+    if local_path.suffix:  # 如果有扩展名，是文件路径
+        # 查找inference.onnx文件
+        inference_file = temp_model_dir / "inference.onnx"
+        if inference_file.exists():
+            # 复制文件到目标位置
+            shutil.copy2(inference_file, local_path)
+            print(f"Successfully downloaded {model_name} to {local_path}")
+        else:
+            # 如果没有inference.onnx，复制整个目录内容
+            for item in temp_model_dir.iterdir():
+                if item.is_file():
+                    shutil.copy2(item, local_path.parent / item.name)
+            print(f"Successfully downloaded {model_name} files to {local_path.parent}")
+    else:  # 如果没有扩展名，是目录路径
+        # 复制整个目录
+        if local_path.exists():
+            shutil.rmtree(local_path)
+        shutil.copytree(temp_model_dir, local_path)
+        print(f"Successfully downloaded {model_name} to {local_path}")
+
+    _invalidate_model_status()
+
+    # 启用了优化模型缓存时，下载后立即生成优化后的模型，首次启动无需再做图优化
+    model_dir = local_path if not local_path.suffix else local_path.parent
+    for model_file in model_dir.glob("*.onnx"):
+        try:
+            prebuild_optimized_model(str(model_file))
+        except Exception as e:
+            print(f"Warning: Failed to optimize {model_file}: {e}")
+
+    # 清理该模型的临时缓存目录，临时根目录为空时一并删除
+    try:
+        if temp_cache_dir.exists():
+            shutil.rmtree(temp_cache_dir)
+            print(f"Cleaned up temporary cache directory: {temp_cache_dir}")
+        try:
+            temp_root.rmdir()
+        except OSError:
+            pass
+    except Exception as cleanup_error:
+        print(f"Warning: Failed to clean up temporary cache directory: {cleanup_error}")
+
 @router.post("/download/{model_name}")
 async def download_model(model_name: str):
     """
@@ -59,58 +141,10 @@ async def download_model(model_name: str):
         raise HTTPException(status_code=404, detail=f"Model {model_name} not found")
 
     config = MODEL_REGISTRY[model_name]
-    work_dir = Path(get_work_dir())
-    local_path = work_dir / config["local_path"]
 
     try:
-        # 确保父目录存在
-        local_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # 使用ModelScope下载
-        from modelscope import snapshot_download
-        print(f"Downloading from ModelScope: {config['modelscope_id']}...")
-
-        # 下载到临时目录（相对于work_dir）
-        temp_cache_dir = work_dir / "temp"
-        temp_dir = snapshot_download(
-            config["modelscope_id"],
-            cache_dir=str(temp_cache_dir)
-        )
-
-        temp_model_dir = Path(temp_dir)
-
-        # 检查local_path是文件还是目录
-        if local_path.suffix:  # 如果有扩展名，是文件路径
-            # 查找inference.onnx文件
-            inference_file = temp_model_dir / "inference.onnx"
-            if inference_file.exists():
-                # 复制文件到目标位置
-                import shutil
-                shutil.copy2(inference_file, local_path)
-                print(f"Successfully downloaded {model_name} to {local_path}")
-            else:
-                # 如果没有inference.onnx，复制整个目录内容
-                for item in temp_model_dir.iterdir():
-                    if item.is_file():
-                        shutil.copy2(item, local_path.parent / item.name)
-                print(f"Successfully downloaded {model_name} files to {local_path.parent}")
-        else:  # 如果没有扩展名，是目录路径
-            # 复制整个目录
-            import shutil
-            if local_path.exists():
-                shutil.rmtree(local_path)
-            shutil.copytree(temp_model_dir, local_path)
-            print(f"Successfully downloaded {model_name} to {local_path}")
-
-        # 清理整个临时缓存目录
-        try:
-            import shutil
-            if temp_cache_dir.exists():
-                shutil.rmtree(temp_cache_dir)
-                print(f"Cleaned up temporary cache directory: {temp_cache_dir}")
-        except Exception as cleanup_error:
-            print(f"Warning: Failed to clean up temporary cache directory: {cleanup_error}")
-
+        # 下载和复制文件都是阻塞操作，放到线程中执行，避免阻塞事件循环
+        await run_in_threadpool(_download_model_files, model_name, config)
         return {"message": f"Model {model_name} downloaded successfully"}
 
     except ImportError:
@@ -151,83 +185,37 @@ async def delete_model(model_name: str):
     except Exception as e:
         print(f"Failed to delete model {model_name}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to delete model {model_name}: {str(e)}")
+    finally:
+        _invalidate_model_status()
 
 @router.post("/batch-download")
 async def batch_download_models(model_names: List[str]):
     """
-    批量下载模型
+    批量下载模型（多个模型并发下载，总耗时取决于最慢的模型）
     """
     if not model_names:
         raise HTTPException(status_code=400, detail="No models specified")
 
-    results = []
-    for model_name in model_names:
+    def download_one(model_name: str) -> Dict[str, Any]:
+        # 复用单个下载的逻辑
+        config = MODEL_REGISTRY.get(model_name)
+        if not config:
+            return {"model": model_name, "success": False, "error": "Model not found"}
         try:
-            # 复用单个下载的逻辑
-            config = MODEL_REGISTRY.get(model_name)
-            if not config:
-                results.append({"model": model_name, "success": False, "error": "Model not found"})
-                continue
-
-            work_dir = Path(get_work_dir())
-            local_path = work_dir / config["local_path"]
-
-            # 确保父目录存在
-            local_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # 使用ModelScope下载
-            from modelscope import snapshot_download
-            print(f"Downloading from ModelScope: {config['modelscope_id']}...")
-
-            # 下载到临时目录（相对于work_dir）
-            temp_cache_dir = work_dir / "temp"
-            temp_dir = snapshot_download(
-                config["modelscope_id"],
-                cache_dir=str(temp_cache_dir)
-            )
-
-            temp_model_dir = Path(temp_dir)
-
-            # 检查local_path是文件还是目录
-            if local_path.suffix:  # 如果有扩展名，是文件路径
-                # 查找inference.onnx文件
-                inference_file = temp_model_dir / "inference.onnx"
-                if inference_file.exists():
-                    # 复制文件到目标位置
-                    import shutil
-                    shutil.copy2(inference_file, local_path)
-                    print(f"Successfully downloaded {model_name} to {local_path}")
-                    results.append({"model": model_name, "success": True})
-                else:
-                    # 如果没有inference.onnx，复制整个目录内容
-                    for item in temp_model_dir.iterdir():
-                        if item.is_file():
-                            shutil.copy2(item, local_path.parent / item.name)
-                    print(f"Successfully downloaded {model_name} files to {local_path.parent}")
-                    results.append({"model": model_name, "success": True})
-            else:  # 如果没有扩展名，是目录路径
-                # 复制整个目录
-                import shutil
-                if local_path.exists():
-                    shutil.rmtree(local_path)
-                shutil.copytree(temp_model_dir, local_path)
-                print(f"Successfully downloaded {model_name} to {local_path}")
-                results.append({"model": model_name, "success": True})
-
-            # 清理临时目录
-            try:
-                import shutil
-                if temp_cache_dir.exists():
-                    shutil.rmtree(temp_cache_dir)
-                    print(f"Cleaned up temporary cache directory: {temp_cache_dir}")
-            except Exception as cleanup_error:
-                print(f"Warning: Failed to clean up temporary cache directory: {cleanup_error}")
-
+            _download_model_files(model_name, config)
+            return {"model": model_name, "success": True}
         except Exception as e:
             print(f"Failed to download model {model_name}: {e}")
-            results.append({"model": model_name, "success": False, "error": str(e)})
+            return {"model": model_name, "success": False, "error": str(e)}
+
+    # 去重后并发下载，结果按请求顺序返回
+    unique_names = list(dict.fromkeys(model_names))
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=min(MODEL_DOWNLOAD_WORKERS, len(unique_names))) as executor:
+        outcomes = await asyncio.gather(*(loop.run_in_executor(executor, download_one, name) for name in unique_names))
+    by_name = dict(zip(unique_names, outcomes))
 
-    return {"results": results}
+    return {"results": [by_name[name] for name in model_names]}
 
 @router.delete("/batch-delete")
 async def batch_delete_models(model_names: List[str]):
@@ -266,4 +254,5 @@ async def batch_delete_models(model_names: List[str]):
             print(f"Failed to delete model {model_name}: {e}")
             results.append({"model": model_name, "success": False, "error": str(e)})
 
+    _invalidate_model_status()
     return {"results": results}
\ No newline at end of file
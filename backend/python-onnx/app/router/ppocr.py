@@ -1,10 +1,18 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, Body
-from fastapi.responses import JSONResponse, StreamingResponse
-from PIL import Image
-import io
-import json
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import base64
+import cv2
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+import logging
+import os
+import threading
 import numpy as np
-from ..core.utils import draw_ocr
+from ..core.cache import LRUCache, hash_bytes, hash_file
+from ..core.utils import draw_ocr, decode_image, encode_image, normalize_image_format, read_file_buffer, DRAW_MEDIA_TYPES, DefaultResponse, json_loads, json_dumps_sorted, upload_too_large, upload_too_large_response
 
 # 导入新的pipeline
 try:
@@ -15,6 +23,8 @@ except ImportError:
 
 from ..config import get_work_dir, get_pipeline_default_models, get_pipeline_model_options_by_name, get_model_path_from_registry
 
+logger = logging.getLogger(__name__)
+
 # 全局pipeline实例（用于保持加载状态）
 _global_pipeline = None
 _global_pipeline_models = None
@@ -27,6 +37,9 @@ def get_global_pipeline():
 def set_global_pipeline(pipeline, models_key):
     """设置全局pipeline实例"""
     global _global_pipeline, _global_pipeline_models
+    if models_key != _global_pipeline_models:
+        # 模型变化后缓存的识别结果不再有效
+        _ocr_cache.clear()
     _global_pipeline = pipeline
     _global_pipeline_models = models_key
 
@@ -34,13 +47,209 @@ def get_pipeline_models_key(det_model, rec_model, cls_model):
     """生成pipeline模型的唯一键"""
     return f"{det_model}|{rec_model}|{cls_model}"
 
+# 保护全局pipeline的创建和加载，避免并发的首次请求重复创建实例、重复加载模型
+_pipeline_lock = threading.Lock()
+
+def _ensure_pipeline(models_key=None, create=None):
+    """
+    获取已加载模型的全局pipeline，必要时创建并加载
+
+    Args:
+        models_key: 需要的模型组合，为None时接受任意已存在的pipeline
+        create: 创建pipeline实例的函数（缺少模型文件时应抛出异常）
+    """
+    def is_ready(pipeline):
+        return (pipeline is not None
+                and (models_key is None or _global_pipeline_models == models_key)
+                and pipeline.is_loaded())
+
+    pipeline = get_global_pipeline()
+    if is_ready(pipeline):
+        return pipeline
+
+    with _pipeline_lock:
+        pipeline = get_global_pipeline()
+        if pipeline is None or (models_key is not None and _global_pipeline_models != models_key):
+            pipeline = create()
+            set_global_pipeline(pipeline, models_key)
+        if not pipeline.is_loaded():
+            success, error_msg = pipeline.load()
+            if not success:
+                raise RuntimeError(error_msg or "模型加载失败")
+        return pipeline
+
+def _create_default_pipeline():
+    """使用默认模型目录创建pipeline"""
+    det_model, rec_model, cls_model = _model_paths()
+    return PPOCRv5Pipeline(
+        det_model_path=str(det_model),
+        rec_model_path=str(rec_model),
+        cls_model_path=str(cls_model),
+        use_gpu=False
+    )
+
+def warmup_pipeline():
+    """
+    预热OCR模型：加载默认模型并对空白小图执行一次推理，提前完成ONNX Runtime会话和内存池的初始化。
+    模型文件不完整时直接跳过。
+    """
+    if not HAS_PIPELINE or not _models_exist():
+        return
+    try:
+        pipeline = _ensure_pipeline(get_pipeline_models_key(*DEFAULT_MODEL_NAMES), _create_default_pipeline)
+        pipeline.ocr(np.full((64, 64, 3), 255, dtype=np.uint8))
+        logger.info("OCR模型预热完成")
+    except Exception as e:
+        logger.warning("OCR模型预热失败: %s", e)
+
+# /load 与 /model_status 使用的默认模型
+DEFAULT_MODEL_NAMES = ("PP-OCRv5_mobile_det-ONNX", "PP-OCRv5_mobile_rec-ONNX", "PP-LCNet_x1_0_doc_ori-ONNX")
+_models_exist_cached = False
+
+@lru_cache(maxsize=1)
+def _model_paths():
+    """
+    默认模型目录路径（只解析一次）
+
+    注意：模型路径应该是目录路径，模型类会自动在内部拼接 /inference.onnx
+    """
+    models_dir = Path(get_work_dir()) / "models"
+    return tuple(models_dir / name for name in DEFAULT_MODEL_NAMES)
+
+def _missing_model_files():
+    """检查模型目录内是否存在 inference.onnx 文件，返回缺失文件列表"""
+    return [
+        f"{name}/inference.onnx"
+        for name, path in zip(DEFAULT_MODEL_NAMES, _model_paths())
+        if not (path / "inference.onnx").is_file()
+    ]
+
+def _models_exist():
+    """模型文件是否完整；确认完整后不再重复访问磁盘（前端会频繁轮询状态），遇到第一个缺失文件即停止检查"""
+    global _models_exist_cached
+    if not _models_exist_cached:
+        _models_exist_cached = all((path / "inference.onnx").is_file() for path in _model_paths())
+    return _models_exist_cached
+
+def _invalidate_models_exist():
+    """模型文件可能发生变化时清除缓存"""
+    global _models_exist_cached
+    _model_paths.cache_clear()
+    _models_exist_cached = False
+
 try:
     import fitz  # pymupdf
     HAS_FITZ = True
 except ImportError:
     HAS_FITZ = False
 
-router = APIRouter()
+def _json_response(content):
+    """
+    直接构造JSON响应返回
+
+    接口返回dict时FastAPI会先用jsonable_encoder逐项遍历转换，识别结果包含成百上千个框时开销明显；
+    结果已是纯Python类型（置信度等已由numpy转换为float），可跳过这一步直接序列化。
+    """
+    return DefaultResponse(content=content)
+
+router = APIRouter(default_response_class=DefaultResponse)
+
+# PDF默认渲染分辨率
+DEFAULT_PDF_DPI = 200
+
+# 自适应分辨率：先以低分辨率渲染估计文字行高，再选择使文字行高达到目标像素的分辨率
+ADAPTIVE_PROBE_DPI = 72
+ADAPTIVE_TARGET_TEXT_HEIGHT = 16
+ADAPTIVE_MIN_DPI = 150
+ADAPTIVE_MAX_DPI = 300
+
+# PDF页面渲染后的长边像素上限：超大幅面页面（如图纸、海报）自动降低分辨率，避免渲染出巨幅图像占满内存，
+# 可通过环境变量 PDF_MAX_LONG_SIDE 配置
+PDF_MAX_LONG_SIDE = int(os.getenv("PDF_MAX_LONG_SIDE", "4000"))
+
+# 识别结果的最低文本置信度，低于该值的结果不返回
+MIN_TEXT_CONFIDENCE = 0.1
+
+# /draw 中没有OCR结果的页面使用的预览分辨率
+EMPTY_PAGE_DPI = 72
+
+# PDF渲染并行数
+PDF_RENDER_WORKERS = max(1, min(int(os.getenv("PDF_RENDER_WORKERS", "4")), os.cpu_count() or 1))
+
+# PDF渲染并行方式：thread（默认，MuPDF渲染时释放GIL）或 process（多进程，适合高DPI的大型PDF）
+PDF_RENDER_BACKEND = os.getenv("PDF_RENDER_BACKEND", "thread").lower()
+
+# 页数不超过该值时直接串行渲染，避免线程/进程调度开销
+PDF_RENDER_SERIAL_PAGES = 2
+
+# PDF多页OCR线程池：ONNX Runtime推理时释放GIL，各页可并行识别
+OCR_PAGE_WORKERS = max(1, min(int(os.getenv("OCR_PAGE_WORKERS", "4")), os.cpu_count() or 1))
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix="ocr-page")
+
+# /draw 多页绘制和编码线程池
+_draw_executor = ThreadPoolExecutor(max_workers=PDF_RENDER_WORKERS, thread_name_prefix="ocr-draw")
+
+# /draw 绘制结果缓存：键为(文件哈希, 页索引, 绘制内容哈希)，值为编码后的PNG字节
+_draw_cache = LRUCache(max_size=256)
+
+# OCR结果缓存：键为(图像内容哈希, 识别参数)，值为格式化后的结果列表；
+# 重复上传的文件或PDF中重复的页面无需再次推理
+_ocr_cache = LRUCache(max_size=256)
+
+def _draw_cache_key(file_hash, page_idx, boxes, rotation, dpi=None, out_format="png"):
+    """根据文件、页码、渲染分辨率、输出格式以及要绘制的框和旋转角度生成缓存键"""
+    payload = json_dumps_sorted({"boxes": boxes, "rotation": rotation, "dpi": dpi, "format": out_format})
+    return (file_hash, page_idx, hash_bytes(payload))
+
+def clear_result_caches():
+    """清空绘制结果缓存和OCR结果缓存"""
+    _draw_cache.clear()
+    _ocr_cache.clear()
+
+def _extract_draw_inputs(page_result, drop_score):
+    """
+    将单页pipeline格式结果转换为draw_ocr期望的格式
+
+    Args:
+        page_result: 单页的OCR结果列表
+        drop_score: 丢弃分数阈值
+
+    Returns:
+        (rotation, boxes, txts, scores): 页面的全局旋转角度以及过滤后的框、文本和分数
+    """
+    # 提取页面的全局rotation角度
+    rotation = 0
+    if page_result and isinstance(page_result[0], dict):
+        rotation = page_result[0].get("rotation", 0)
+
+    # 先做一次格式校验，之后draw_ocr无需再按分数过滤
+    kept = [
+        result for result in page_result
+        if isinstance(result, dict) and "box" in result and "text" in result
+    ]
+    if not kept:
+        return rotation, [], [], []
+
+    # 置信度一次性转换为数组，drop_score过滤向量化完成；
+    # drop_score<=0（默认值）时置信度不可能低于阈值，直接保留全部结果
+    scores = np.fromiter((result.get("text_confidence", 0) for result in kept), dtype=np.float64, count=len(kept))
+    if drop_score > 0:
+        keep = np.flatnonzero(scores >= drop_score).tolist()
+        kept = [kept[i] for i in keep]
+        scores = scores[keep]
+    boxes = [result["box"] for result in kept]
+    txts = [result["text"] for result in kept]
+    scores = scores.tolist()
+    return rotation, boxes, txts, scores
+
+def _writable_canvas(img):
+    """
+    返回可直接原地绘制的图像：本地持有且可写、连续的数组直接复用，
+    否则（如PDF渲染得到的只读缓冲区视图）返回None，由draw_ocr复制一次
+    """
+    if img.flags.writeable and img.flags.c_contiguous:
+        return img
+    return None
 
 def rotate_image(img, rotation_angle):
     """
@@ -53,339 +262,583 @@ def rotate_image(img, rotation_angle):
     Returns:
         numpy数组: 旋转后的图像
     """
-    if rotation_angle == 0:
+    if rotation_angle % 360 == 0:
         return img
-    
-    # 将numpy数组转换为PIL Image
-    pil_img = Image.fromarray(img)
-    
-    # 旋转图像（逆时针旋转rotation_angle度）
-    rotated_pil_img = pil_img.rotate(-rotation_angle, expand=True)
-    
-    # 转换回numpy数组
-    rotated_img = np.array(rotated_pil_img)
-    
-    return rotated_img
 
-def pdf_to_images_from_bytes(pdf_bytes, dpi=200):
-    """将PDF字节数据转换为图像列表"""
+    # 90度的整数倍：仅是数据重排，不需要插值
+    if rotation_angle % 90 == 0:
+        return np.ascontiguousarray(np.rot90(img, -(rotation_angle // 90) % 4))
+
+    # 任意角度：顺时针旋转并扩展画布以容纳完整图像
+    h, w = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), -rotation_angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_w = int(round(h * sin + w * cos))
+    new_h = int(round(h * cos + w * sin))
+    matrix[0, 2] += new_w / 2 - w / 2
+    matrix[1, 2] += new_h / 2 - h / 2
+    return cv2.warpAffine(img, matrix, (new_w, new_h), flags=cv2.INTER_LINEAR)
+
+def get_pdf_page_count(pdf_bytes):
+    """获取PDF页数（不渲染页面）"""
+    if not HAS_FITZ:
+        raise RuntimeError("未安装pymupdf库，无法处理PDF文件。请先安装pymupdf。")
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+def get_pdf_page_long_sides(pdf_bytes):
+    """获取每页长边尺寸（单位为点，即1/72英寸，不渲染页面）"""
+    if not HAS_FITZ:
+        raise RuntimeError("未安装pymupdf库，无法处理PDF文件。请先安装pymupdf。")
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [max(page.rect.width, page.rect.height) for page in doc]
+
+def cap_page_dpi(dpi, long_side_pt, max_long_side=PDF_MAX_LONG_SIDE):
+    """限制渲染分辨率，使页面渲染后的长边不超过max_long_side像素"""
+    if long_side_pt <= 0:
+        return dpi
+    return max(1, min(dpi, int(max_long_side * 72 / long_side_pt)))
+
+def _render_pdf_pages(pdf_bytes, dpi, page_indices):
+    """
+    在单个线程中渲染指定页面（每个线程独立打开文档，PyMuPDF文档对象不可跨线程共享）
+
+    以stream方式打开时MuPDF直接引用传入的bytes，各线程共享同一份PDF数据，不会额外复制
+    """
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        images = []
+        for page_idx in page_indices:
+            page = doc.load_page(page_idx)
+            # 直接渲染不带alpha通道的RGB图像，得到连续内存，无需再切片去除alpha
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            img = np.frombuffer(pix.samples, dtype=np.uint8).reshape((pix.height, pix.width, 3))
+            images.append(img)
+        return images
+
+def pdf_to_images_from_bytes(pdf_bytes, dpi=200, page_indices=None):
+    """
+    将PDF字节数据转换为图像列表
+
+    get_pixmap 渲染时会释放GIL，多页PDF按页分组后并行渲染，并行数可通过环境变量
+    PDF_RENDER_WORKERS 配置（默认4），PDF_RENDER_BACKEND=process 时改用多进程渲染。
+
+    Args:
+        pdf_bytes: PDF文件字节数据
+        dpi: 渲染分辨率
+        page_indices: 需要渲染的页索引列表（从0开始），为None时渲染全部页面
+    """
     if not HAS_FITZ:
         raise RuntimeError("未安装pymupdf库，无法处理PDF文件。请先安装pymupdf。")
     
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    images = []
-    for page in doc:
-        pix = page.get_pixmap(dpi=dpi)
-        img = np.frombuffer(pix.samples, dtype=np.uint8)
-        img = img.reshape((pix.height, pix.width, pix.n))
-        if pix.n == 4:
-            # 移除alpha通道
-            img = img[:, :, :3]
-        images.append(img)
-    doc.close()
+    if page_indices is None:
+        page_indices = range(get_pdf_page_count(pdf_bytes))
+    page_indices = list(page_indices)
+
+    workers = min(PDF_RENDER_WORKERS, len(page_indices))
+    if workers <= 1 or len(page_indices) <= PDF_RENDER_SERIAL_PAGES:
+        return _render_pdf_pages(pdf_bytes, dpi, page_indices)
+
+    # 按连续页分组，保证结果顺序与 page_indices 一致
+    chunk_size = (len(page_indices) + workers - 1) // workers
+    chunks = [page_indices[i:i + chunk_size] for i in range(0, len(page_indices), chunk_size)]
+    executor_cls = ProcessPoolExecutor if PDF_RENDER_BACKEND == "process" else ThreadPoolExecutor
+    with executor_cls(max_workers=len(chunks)) as executor:
+        rendered = executor.map(_render_pdf_pages, [pdf_bytes] * len(chunks), [dpi] * len(chunks), chunks)
+        return [img for chunk_images in rendered for img in chunk_images]
+
+
+def _format_ocr_results(results):
+    """将pipeline输出转换为接口返回的pipeline格式，并过滤低置信度结果"""
+    if not results:
+        return []
+
+    # 置信度一次性转换为数组，过滤和float转换都向量化完成
+    count = len(results)
+    confidences = np.fromiter((result["confidence"] for result in results), dtype=np.float64, count=count)
+    rotation_confidences = np.fromiter((result["rotation_confidence"] for result in results), dtype=np.float64, count=count)
+    keep = np.flatnonzero(confidences >= MIN_TEXT_CONFIDENCE).tolist()
+    confidences = confidences.tolist()
+    rotation_confidences = rotation_confidences.tolist()
+
+    return [
+        {
+            "box": results[i]["bbox"],
+            "text": results[i]["text"],
+            "text_confidence": confidences[i],
+            "rotation": results[i]["rotation"],
+            "rotation_confidence": rotation_confidences[i],
+            "text_direction": None  # 预留字段，用于将来添加文字方向信息
+        }
+        for i in keep
+    ]
+
+# 空白页判定：原图像素值极差低于该阈值（或图像边长过小）时视为空白，跳过OCR
+BLANK_RANGE_THRESHOLD = 8
+BLANK_MIN_SIDE = 8
+
+def _is_blank(img):
+    """
+    保守地判断图像是否为空白页（扫描文档中常见的空白衬页）
+
+    只把近乎纯色的图像和边长过小的图像视为空白。极差在原分辨率上计算，
+    不做缩小：缩略图的区域平均会把浅灰色或稀疏的细笔画文字平均掉，导致误判为空白。
+    """
+    h, w = img.shape[:2]
+    if min(h, w) < BLANK_MIN_SIDE:
+        return True
+    return int(img.max()) - int(img.min()) < BLANK_RANGE_THRESHOLD
+
+def _pipeline_ocr_one(pipeline, img, ocr_params, skip_blank=False):
+    """对单张图像（或PDF单页）进行OCR，返回格式化后的结果列表（相同图像和参数直接复用缓存结果）"""
+    # 仅在不合并重叠框时跳过空白图像
+    if skip_blank and not ocr_params.get("merge_overlaps") and _is_blank(img):
+        return []
+    img = np.ascontiguousarray(img)
+    cache_key = (hash_bytes(img), img.shape, tuple(sorted(ocr_params.items())))
+    results = _ocr_cache.get(cache_key)
+    if results is None:
+        results = _format_ocr_results(pipeline.ocr(img, **ocr_params))
+        _ocr_cache.put(cache_key, results)
+    return results
+
+def _decode_image_file(fileobj):
+    """从文件对象解码为RGB格式的numpy图像"""
+    return decode_image(read_file_buffer(fileobj))
+
+def _draw_and_encode(img, rotation, boxes, drop_score, out_format):
+    """旋转图像、绘制OCR边界框并编码为图片字节"""
+    if boxes:
+        # 根据页面的rotation角度旋转图像
+        rotated_img = rotate_image(img, rotation)
+
+        # 在旋转后的图像上绘制OCR结果（只绘制边界框，不显示文字）
+        img = draw_ocr(rotated_img, boxes, txts=None, scores=None, drop_score=drop_score, out=_writable_canvas(rotated_img))
+    return encode_image(img, out_format)
+
+def _draw_and_encode_page(img, rotation, boxes, drop_score, out_format):
+    """
+    绘制并编码单页（在线程池中运行）
+
+    Returns:
+        (encoded, img_base64): 编码后的图片字节及其base64字符串
+    """
+    encoded = _draw_and_encode(img, rotation, boxes, drop_score, out_format)
+    return encoded, base64.b64encode(encoded).decode('ascii')
+
+def pdf_pages_to_images(pdf_bytes, page_dpis):
+    """
+    按页使用不同分辨率渲染PDF
+
+    Args:
+        pdf_bytes: PDF文件字节数据
+        page_dpis: {页索引(从0开始): 分辨率}
+
+    Returns:
+        dict: {页索引: 图像}
+    """
+    by_dpi = {}
+    for page_idx, page_dpi in page_dpis.items():
+        by_dpi.setdefault(page_dpi, []).append(page_idx)
+
+    images = {}
+    for page_dpi, page_indices in by_dpi.items():
+        images.update(zip(page_indices, pdf_to_images_from_bytes(pdf_bytes, dpi=page_dpi, page_indices=page_indices)))
     return images
 
+def choose_adaptive_dpis(pipeline, pdf_bytes, page_count, default_dpi, conf_threshold):
+    """
+    根据每页文字大小选择渲染分辨率
+
+    先以低分辨率渲染并仅运行文本检测，估计文字行高h，再选择使行高达到
+    ADAPTIVE_TARGET_TEXT_HEIGHT 像素的分辨率；未检测到文字的页面使用默认分辨率。
 
-@router.post("/")
-async def recognize(
-    file: UploadFile = File(...),
+    Returns:
+        dict: {页索引(从0开始): 分辨率}
+    """
+    probes = pdf_to_images_from_bytes(pdf_bytes, dpi=ADAPTIVE_PROBE_DPI, page_indices=range(page_count))
+    page_dpis = {}
+    for page_idx, probe in enumerate(probes):
+        text_height = pipeline.estimate_text_height(probe, conf_threshold=conf_threshold)
+        if not text_height:
+            page_dpis[page_idx] = default_dpi
+            continue
+        target_dpi = int(ADAPTIVE_PROBE_DPI * ADAPTIVE_TARGET_TEXT_HEIGHT / max(text_height, 1))
+        page_dpis[page_idx] = min(ADAPTIVE_MAX_DPI, max(ADAPTIVE_MIN_DPI, target_dpi))
+    return page_dpis
+
+
+def _recognize_form(
     det_db_thresh: float = Form(0.3),
     cls_thresh: float = Form(0.9),
     use_cls: bool = Form(True),
     merge_overlaps: bool = Form(False),
     overlap_threshold: float = Form(0.9),
+    dpi: int = Form(DEFAULT_PDF_DPI),
+    adaptive_dpi: bool = Form(False),
+    skip_blank: bool = Form(False),
     det_model: str = Form(None),
     rec_model: str = Form(None),
     cls_model: str = Form(None)
 ):
     """
-    使用PP-OCRv5 Pipeline进行OCR识别（返回pipeline格式）
+    识别接口（/、/image、/pdf）共用的表单参数
 
     Args:
-        file: 上传的图像文件或PDF文件
         det_db_thresh: 检测阈值（保留参数以保持兼容性）
         cls_thresh: 分类阈值（保留参数以保持兼容性）
         use_cls: 是否使用分类（保留参数以保持兼容性）
         merge_overlaps: 是否合并重叠的文本框
         overlap_threshold: 合并重叠框的重叠度阈值（交集/最小面积）
+        dpi: PDF渲染分辨率（默认200，页面长边超过 PDF_MAX_LONG_SIDE 像素时自动降低）
+        adaptive_dpi: 是否根据每页文字大小自动选择PDF渲染分辨率
+        skip_blank: 是否跳过空白图像/空白页（仅近乎纯色或边长过小的图像，且merge_overlaps为False时生效；直接返回空结果，不执行模型推理）
+        det_model/rec_model/cls_model: 使用的模型名称，为空或"Default"时使用默认模型
     """
+    return {
+        "det_db_thresh": det_db_thresh,
+        "cls_thresh": cls_thresh,
+        "use_cls": use_cls,
+        "merge_overlaps": merge_overlaps,
+        "overlap_threshold": overlap_threshold,
+        "dpi": dpi,
+        "adaptive_dpi": adaptive_dpi,
+        "skip_blank": skip_blank,
+        "det_model": det_model,
+        "rec_model": rec_model,
+        "cls_model": cls_model,
+    }
+
+async def _get_request_pipeline(det_model, rec_model, cls_model):
+    """获取与请求所选模型匹配的pipeline（已加载模型）"""
+    # 处理默认模型配置
+    defaults = get_pipeline_default_models("ppocrv5")
+    
+    actual_det_model = det_model if det_model not in [None, "Default"] else defaults["ocr_det"]
+    actual_rec_model = rec_model if rec_model not in [None, "Default"] else defaults["ocr_rec"]
+    actual_cls_model = cls_model if cls_model not in [None, "Default"] else defaults["doc_cls"]
+    
+    # 获取或创建pipeline实例
+    current_models_key = get_pipeline_models_key(actual_det_model, actual_rec_model, actual_cls_model)
+
+    def create_pipeline():
+        # 根据选择的模型获取路径
+        det_model_path = get_model_path_from_registry(actual_det_model)
+        rec_model_path = get_model_path_from_registry(actual_rec_model)
+        cls_model_path = get_model_path_from_registry(actual_cls_model)
+        
+        if not all([det_model_path, rec_model_path, cls_model_path]):
+            raise ValueError(f"模型文件缺失: det={det_model_path}, rec={rec_model_path}, cls={cls_model_path}")
+        
+        return PPOCRv5Pipeline(
+            det_model_path=det_model_path,
+            rec_model_path=rec_model_path,
+            cls_model_path=cls_model_path,
+            use_gpu=False
+        )
+
+    return await run_in_threadpool(_ensure_pipeline, current_models_key, create_pipeline)
+
+async def _recognize_pdf(file, pipeline, ocr_params, form):
+    """识别PDF文件的每一页"""
+    if not HAS_FITZ:
+        return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
+
+    dpi = form["dpi"]
+    # PDF需要完整字节数据：各渲染线程基于同一份数据各自打开文档
+    contents = await run_in_threadpool(read_file_buffer, file.file)
+    long_sides = await run_in_threadpool(get_pdf_page_long_sides, contents)
+    page_count = len(long_sides)
+    if page_count == 0:
+        return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
+
+    if form["adaptive_dpi"]:
+        page_dpis = await run_in_threadpool(choose_adaptive_dpis, pipeline, contents, page_count, dpi, form["det_db_thresh"])
+    else:
+        page_dpis = {page_idx: dpi for page_idx in range(page_count)}
+    # 按页面尺寸限制分辨率，超大幅面页面不会渲染出超过像素上限的图像
+    page_dpis = {page_idx: cap_page_dpi(page_dpi, long_sides[page_idx]) for page_idx, page_dpi in page_dpis.items()}
+    page_images = await run_in_threadpool(pdf_pages_to_images, contents, page_dpis)
+
+    # 将每一页提交到线程池进行OCR，按页码顺序收集结果
+    loop = asyncio.get_running_loop()
+    page_outputs = await asyncio.gather(
+        *[
+            loop.run_in_executor(_ocr_executor, _pipeline_ocr_one, pipeline, page_images[page_idx], ocr_params, form["skip_blank"])
+            for page_idx in range(page_count)
+        ],
+        return_exceptions=True
+    )
+    del page_images
+
+    all_results = []
+    for page_idx, formatted_results in enumerate(page_outputs):
+        if isinstance(formatted_results, Exception):
+            return JSONResponse(status_code=500, content={"error": f"处理第{page_idx+1}页时出错: {str(formatted_results)}"})
+
+        # 为每页的结果添加页面信息
+        all_results.append({
+            "page": page_idx + 1,
+            "dpi": page_dpis[page_idx],  # /draw 需以相同分辨率渲染，框坐标才能对齐
+            "results": formatted_results
+        })
+
+    return _json_response({"results": all_results})
+
+async def _recognize_image(file, pipeline, ocr_params, form):
+    """识别单张图像"""
+    # 直接从上传的临时文件解码，避免整体读入内存再拷贝
+    img = await run_in_threadpool(_decode_image_file, file.file)
+
+    formatted_results = await run_in_threadpool(_pipeline_ocr_one, pipeline, img, ocr_params, form["skip_blank"])
+
+    return _json_response({"results": formatted_results})
+
+async def _run_recognize(handler, file, form):
+    """识别接口的公共流程：检查依赖和上传大小、获取pipeline，再交给具体的处理函数"""
     if not HAS_PIPELINE:
         return JSONResponse(status_code=500, content={"error": "Pipeline功能不可用，请检查依赖"})
 
-    contents = await file.read()
-    filename = file.filename.lower() if file.filename else ""
+    if upload_too_large(file):
+        return upload_too_large_response()
 
     try:
-        # 处理默认模型配置
-        defaults = get_pipeline_default_models("ppocrv5")
-        
-        actual_det_model = det_model if det_model not in [None, "Default"] else defaults["ocr_det"]
-        actual_rec_model = rec_model if rec_model not in [None, "Default"] else defaults["ocr_rec"]
-        actual_cls_model = cls_model if cls_model not in [None, "Default"] else defaults["doc_cls"]
-        
-        # 获取或创建pipeline实例
-        current_models_key = get_pipeline_models_key(actual_det_model, actual_rec_model, actual_cls_model)
-        pipeline = get_global_pipeline()
-        
-        if pipeline is None or _global_pipeline_models != current_models_key:
-            # 获取或创建pipeline实例时再次获取默认值（以防万一）
-            defaults = get_pipeline_default_models("ppocrv5")
-            
-            actual_det_model = det_model if det_model not in [None, "Default"] else defaults["ocr_det"]
-            actual_rec_model = rec_model if rec_model not in [None, "Default"] else defaults["ocr_rec"]
-            actual_cls_model = cls_model if cls_model not in [None, "Default"] else defaults["doc_cls"]
-            
-            # 根据选择的模型获取路径
-            det_model_path = get_model_path_from_registry(actual_det_model)
-            rec_model_path = get_model_path_from_registry(actual_rec_model)
-            cls_model_path = get_model_path_from_registry(actual_cls_model)
-            
-            if not all([det_model_path, rec_model_path, cls_model_path]):
-                return JSONResponse(status_code=400, content={"error": f"模型文件缺失: det={det_model_path}, rec={rec_model_path}, cls={cls_model_path}"})
-            
-            pipeline = PPOCRv5Pipeline(
-                det_model_path=det_model_path,
-                rec_model_path=rec_model_path,
-                cls_model_path=cls_model_path,
-                use_gpu=False
-            )
-            set_global_pipeline(pipeline, current_models_key)
-
-        # 检查是否为PDF文件
-        if filename.endswith('.pdf'):
-            # 处理PDF文件
-            if not HAS_FITZ:
-                return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
-
-            images = pdf_to_images_from_bytes(contents, dpi=300)
-            if not images:
-                return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
-
-            # 对每一页进行OCR
-            all_results = []
-            for page_idx, img in enumerate(images):
-                try:
-                    # 使用pipeline进行OCR
-                    page_results = pipeline.ocr(img, conf_threshold=det_db_thresh, cls_thresh=cls_thresh, use_cls=use_cls, merge_overlaps=merge_overlaps, overlap_threshold=overlap_threshold)
-
-                    # 直接返回pipeline格式
-                    formatted_results = []
-                    for result in page_results:
-                        if result['confidence'] >= 0.1:  # 过滤低置信度结果
-                            formatted_result = {
-                                "box": result["bbox"],
-                                "text": result["text"],
-                                "text_confidence": float(result["confidence"]),
-                                "rotation": result["rotation"],
-                                "rotation_confidence": float(result["rotation_confidence"]),
-                                "text_direction": None  # 预留字段，用于将来添加文字方向信息
-                            }
-                            formatted_results.append(formatted_result)
-
-                    # 为每页的结果添加页面信息
-                    page_result = {
-                        "page": page_idx + 1,
-                        "results": formatted_results
-                    }
-                    all_results.append(page_result)
-
-                except Exception as e:
-                    return JSONResponse(status_code=500, content={"error": f"处理第{page_idx+1}页时出错: {str(e)}"})
-
-            return {"results": all_results}
-        else:
-            # 处理图像文件
-            img = Image.open(io.BytesIO(contents)).convert("RGB")
-            img = np.array(img)
-
-            # 使用pipeline进行OCR
-            results = pipeline.ocr(img, conf_threshold=det_db_thresh, cls_thresh=cls_thresh, use_cls=use_cls, merge_overlaps=merge_overlaps, overlap_threshold=overlap_threshold)
-
-            # 直接返回pipeline格式
-            formatted_results = []
-            for result in results:
-                if result['confidence'] >= 0.1:  # 过滤低置信度结果
-                    formatted_result = {
-                        "box": result["bbox"],
-                        "text": result["text"],
-                        "text_confidence": float(result["confidence"]),
-                        "rotation": result["rotation"],
-                        "rotation_confidence": float(result["rotation_confidence"]),
-                        "text_direction": None  # 预留字段，用于将来添加文字方向信息
-                    }
-                    formatted_results.append(formatted_result)
+        pipeline = await _get_request_pipeline(form["det_model"], form["rec_model"], form["cls_model"])
+
+        # 本次请求的识别参数：以参数形式传入pipeline，不修改共享的模型状态，并发请求互不影响
+        ocr_params = {
+            "conf_threshold": form["det_db_thresh"],
+            "cls_thresh": form["cls_thresh"],
+            "use_cls": form["use_cls"],
+            "merge_overlaps": form["merge_overlaps"],
+            "overlap_threshold": form["overlap_threshold"],
+        }
 
-            return {"results": formatted_results}
+        return await handler(file, pipeline, ocr_params, form)
 
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
 
+def _is_pdf_upload(file):
+    return bool(file.filename) and file.filename.lower().endswith('.pdf')
 
-@router.post("/draw")
-async def draw_ocr_result(
-    file: UploadFile = File(...),
+
+@router.post("/")
+async def recognize(file: UploadFile = File(...), form: dict = Depends(_recognize_form)):
+    """
+    使用PP-OCRv5 Pipeline进行OCR识别（返回pipeline格式），根据文件扩展名自动区分图像和PDF
+
+    Args:
+        file: 上传的图像文件或PDF文件
+        其余参数见 _recognize_form
+    """
+    handler = _recognize_pdf if _is_pdf_upload(file) else _recognize_image
+    return await _run_recognize(handler, file, form)
+
+
+@router.post("/image")
+async def recognize_image(file: UploadFile = File(...), form: dict = Depends(_recognize_form)):
+    """识别单张图像（不依赖文件名判断类型）"""
+    return await _run_recognize(_recognize_image, file, form)
+
+
+@router.post("/pdf")
+async def recognize_pdf(file: UploadFile = File(...), form: dict = Depends(_recognize_form)):
+    """识别PDF文件（不依赖文件名判断类型）"""
+    return await _run_recognize(_recognize_pdf, file, form)
+
+
+def _draw_form(
     ocr_result: str = Form(...),
     drop_score: float = Form(0.0),
-    max_pages: int = Form(2)
+    max_pages: int = Form(2),
+    dpi: int = Form(DEFAULT_PDF_DPI),
+    out_format: str = Form("png")
 ):
     """
-    绘制OCR结果（仅支持pipeline格式）
+    绘制接口（/draw、/draw/image、/draw/pdf）共用的表单参数
 
     Args:
-        file: 上传的图像文件或PDF文件
         ocr_result: OCR结果的JSON字符串（pipeline格式）
         drop_score: 丢弃分数阈值（0.0表示不过滤，默认0.0）
         max_pages: 对于多页PDF，限制最多处理和返回的页面数（默认2页）
+        dpi: PDF渲染分辨率，应与识别时一致（结果中记录了每页分辨率时优先使用记录值）
+        out_format: 输出图片格式，png（默认）或 jpeg
     """
-    contents = await file.read()
-    filename = file.filename.lower() if file.filename else ""
+    return {
+        "ocr_result": ocr_result,
+        "drop_score": drop_score,
+        "max_pages": max_pages,
+        "dpi": dpi,
+        "out_format": out_format,
+    }
+
+async def _draw_pdf(file, ocr_data, form, out_format):
+    """绘制PDF各页的OCR结果，返回多页图片列表"""
+    if not HAS_FITZ:
+        return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
+
+    drop_score = form["drop_score"]
+    max_pages = form["max_pages"]
+
+    contents = await run_in_threadpool(read_file_buffer, file.file)
+    total_pages = await run_in_threadpool(get_pdf_page_count, contents)
+    if total_pages == 0:
+        return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
+
+    # 限制处理的最大页面数
+    page_count = min(total_pages, max_pages)
+
+    logger.debug("PDF共有%d页，限制处理%d页，实际处理%d页", total_pages, max_pages, page_count)
+
+    file_hash = await run_in_threadpool(hash_bytes, contents)
+
+    # 仅支持pipeline格式
+    results = ocr_data.get("results")
+    if not isinstance(results, list):
+        results = None
+
+    # 多页PDF格式预先建立 页码 -> 结果 的索引，避免每页都线性查找；
+    # 单页格式（理论上PDF不应该有这个情况）所有页面共用同一结果
+    by_page = None
+    page_dpis = {}
+    if results and isinstance(results[0], dict) and "page" in results[0]:
+        by_page = {}
+        for page_data in results:
+            if isinstance(page_data, dict) and "page" in page_data:
+                by_page[page_data["page"]] = page_data.get("results", [])
+                if page_data.get("dpi"):
+                    page_dpis[page_data["page"]] = page_data["dpi"]
+
+    # 每页需要绘制的内容：(旋转角度, 边界框列表, 渲染分辨率, 缓存键)；
+    # 没有可绘制框的页面无需高分辨率渲染，以低分辨率预览图作为占位，保持返回的页面列表完整
+    page_plans = []
+    for page_idx in range(page_count):
+        page_rotation, boxes = 0, []
+        if results is not None:
+            page_result = by_page.get(page_idx + 1, []) if by_page is not None else results
+            page_rotation, boxes, _, _ = _extract_draw_inputs(page_result, drop_score)
+        page_dpi = page_dpis.get(page_idx + 1, form["dpi"]) if boxes else EMPTY_PAGE_DPI
+
+        cache_key = _draw_cache_key(file_hash, page_idx, boxes, page_rotation, page_dpi, out_format)
+        page_plans.append((page_rotation, boxes, page_dpi, cache_key))
+
+    # 只渲染缓存未命中的页面
+    encoded_pages = [_draw_cache.get(plan[3]) for plan in page_plans]
+    missing_dpis = {i: page_plans[i][2] for i, data in enumerate(encoded_pages) if data is None}
+    rendered = await run_in_threadpool(pdf_pages_to_images, contents, missing_dpis) if missing_dpis else {}
+
+    # 各页的绘制、编码和base64编码在线程池中并行进行（cv2绘制/编码时释放GIL）
+    loop = asyncio.get_running_loop()
+    rendered_indices = list(rendered)
+    drawn_outputs = await asyncio.gather(*[
+        loop.run_in_executor(
+            _draw_executor, _draw_and_encode_page,
+            rendered[page_idx], page_plans[page_idx][0], page_plans[page_idx][1], drop_score, out_format
+        )
+        for page_idx in rendered_indices
+    ])
+    del rendered
+
+    page_base64 = [None] * page_count
+    for page_idx, (encoded, img_base64) in zip(rendered_indices, drawn_outputs):
+        _draw_cache.put(page_plans[page_idx][3], encoded)
+        encoded_pages[page_idx] = encoded
+        page_base64[page_idx] = img_base64
+
+    # 为每一页生成单独的图片并返回
+    page_images = []
+    for page_idx, encoded in enumerate(encoded_pages):
+        # 缓存命中的页面在此编码为base64
+        img_base64 = page_base64[page_idx] or base64.b64encode(encoded).decode('ascii')
+        page_images.append({
+            "page_number": page_idx + 1,
+            "media_type": DRAW_MEDIA_TYPES[out_format],
+            "data": img_base64
+        })
+
+    # 返回JSON格式的多页图片列表
+    logger.debug("返回%d页的OCR绘制结果（总共%d页）", len(page_images), total_pages)
+    return _json_response({
+        'file_type': 'pdf',
+        'total_pages': total_pages,
+        'processed_pages': len(page_images),
+        'max_pages_limit': max_pages,
+        'images': page_images
+    })
+
+async def _draw_image(file, ocr_data, form, out_format):
+    """绘制单张图像的OCR结果，直接返回图片"""
+    # 仅支持pipeline格式
+    if "results" not in ocr_data or not isinstance(ocr_data["results"], list):
+        return JSONResponse(status_code=400, content={"error": "Invalid OCR result format - expected pipeline format with 'results' field"})
+
+    drop_score = form["drop_score"]
+    global_rotation, boxes, _, _ = _extract_draw_inputs(ocr_data["results"], drop_score)
+
+    if not boxes:
+        # 没有有效结果，直接返回上传的原图，无需解码和重新编码
+        await file.seek(0)
+        return Response(content=await file.read(), media_type=file.content_type or "application/octet-stream")
+
+    file_hash = await run_in_threadpool(hash_file, file.file)
+    cache_key = _draw_cache_key(file_hash, 0, boxes, global_rotation, None, out_format)
+    encoded = _draw_cache.get(cache_key)
+    if encoded is None:
+        img_np = await run_in_threadpool(_decode_image_file, file.file)
+        encoded = await run_in_threadpool(_draw_and_encode, img_np, global_rotation, boxes, drop_score, out_format)
+        _draw_cache.put(cache_key, encoded)
+    return Response(content=encoded, media_type=DRAW_MEDIA_TYPES[out_format])
+
+async def _run_draw(handler, file, form):
+    """绘制接口的公共流程：校验输出格式、上传大小和ocr_result，再交给具体的处理函数"""
+    out_format = normalize_image_format(form["out_format"])
+    if out_format is None:
+        return JSONResponse(status_code=400, content={"error": f"不支持的输出格式: {form['out_format']}，仅支持 png 或 jpeg"})
+
+    if upload_too_large(file):
+        return upload_too_large_response()
+
+    # 解析ocr_result JSON字符串，格式错误属于请求错误，直接返回400
+    try:
+        ocr_data = json_loads(form["ocr_result"])
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"ocr_result不是有效的JSON: {str(e)}"})
+    if not isinstance(ocr_data, dict):
+        return JSONResponse(status_code=400, content={"error": "Invalid OCR result format - expected pipeline format with 'results' field"})
 
     try:
-        # 解析ocr_result JSON字符串
-        ocr_data = json.loads(ocr_result)
-
-        if filename.endswith('.pdf'):
-            # 处理PDF文件
-            if not HAS_FITZ:
-                return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
-
-            images = pdf_to_images_from_bytes(contents, dpi=300)
-            if not images:
-                return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
-
-            # 限制处理的最大页面数
-            total_pages = len(images)
-            limited_images = images[:max_pages]
-
-            print(f"PDF共有{total_pages}页，限制处理{max_pages}页，实际处理{len(limited_images)}页")
-
-            drawn_pages = []
-            for page_idx, img in enumerate(limited_images):
-                # 仅支持pipeline格式
-                if "results" in ocr_data and isinstance(ocr_data["results"], list):
-                    results = ocr_data["results"]
-                    
-                    # 检查是否为多页PDF格式
-                    if len(results) > 0 and isinstance(results[0], dict) and "page" in results[0]:
-                        # 多页PDF格式，找到对应页面的结果
-                        page_result = None
-                        for page_data in results:
-                            if page_data.get("page") == page_idx + 1:
-                                page_result = page_data.get("results", [])
-                                break
-                        if page_result is None:
-                            page_result = []
-                    else:
-                        # 单页格式（理论上PDF不应该有这个情况）
-                        page_result = results
-
-                    # 转换为draw_ocr期望的格式
-                    boxes = []
-                    txts = []
-                    scores = []
-
-                    # 提取该页的全局rotation角度
-                    page_rotation = 0
-                    if page_result and len(page_result) > 0 and isinstance(page_result[0], dict):
-                        page_rotation = page_result[0].get("rotation", 0)
-
-                    for result in page_result:
-                        if isinstance(result, dict) and "box" in result and "text" in result:
-                            if result.get("text_confidence", 0) >= drop_score:
-                                boxes.append(result["box"])
-                                txts.append(result["text"])
-                                scores.append(result.get("text_confidence", 0))
-
-                    if boxes:
-                        # 根据页面的rotation角度旋转图像
-                        rotated_img = rotate_image(img, page_rotation)
-                        
-                        # 在旋转后的图像上绘制OCR结果（只绘制边界框，不显示文字）
-                        drawn_img = draw_ocr(rotated_img, boxes, txts=None, scores=None, drop_score=drop_score)
-                        drawn_pages.append(drawn_img)
-                    else:
-                        drawn_pages.append(img)
-                else:
-                    # 如果没有有效的pipeline结果，直接使用原图
-                    drawn_pages.append(img)
-
-            # 为每一页生成单独的图片并返回
-            page_images = []
-            for page_idx, drawn_img in enumerate(drawn_pages):
-                # Convert to PIL Image
-                pil_img = Image.fromarray(drawn_img)
-                # Save to BytesIO
-                buf = io.BytesIO()
-                pil_img.save(buf, format='PNG')
-                buf.seek(0)
-                # 将图片数据编码为base64
-                import base64
-                img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-                page_images.append({
-                    "page_number": page_idx + 1,
-                    "data": img_base64
-                })
-
-            # 返回JSON格式的多页图片列表
-            print(f"返回{len(page_images)}页的OCR绘制结果（总共{total_pages}页）")
-            return {
-                'file_type': 'pdf',
-                'total_pages': total_pages,
-                'processed_pages': len(page_images),
-                'max_pages_limit': max_pages,
-                'images': page_images
-            }
-        else:
-            # 处理图像文件
-            img = Image.open(io.BytesIO(contents)).convert("RGB")
-            img_np = np.array(img)
-
-            # 仅支持pipeline格式
-            if "results" in ocr_data and isinstance(ocr_data["results"], list):
-                results = ocr_data["results"]
-
-                # 提取全局rotation角度
-                global_rotation = 0
-                if results and len(results) > 0 and isinstance(results[0], dict):
-                    global_rotation = results[0].get("rotation", 0)
-
-                # 转换为draw_ocr期望的格式
-                boxes = []
-                txts = []
-                scores = []
-
-                for result in results:
-                    if isinstance(result, dict) and "box" in result and "text" in result:
-                        if result.get("text_confidence", 0) >= drop_score:
-                            boxes.append(result["box"])
-                            txts.append(result["text"])
-                            scores.append(result.get("text_confidence", 0))
-
-                if boxes:
-                    # 根据全局rotation角度旋转图像
-                    rotated_img = rotate_image(img_np, global_rotation)
-                    
-                    # 在旋转后的图像上绘制OCR结果（只绘制边界框，不显示文字）
-                    drawn_img = draw_ocr(rotated_img, boxes, txts=None, scores=None, drop_score=drop_score)
-                    # Convert to PIL Image
-                    pil_img = Image.fromarray(drawn_img)
-                    # Save to BytesIO
-                    buf = io.BytesIO()
-                    pil_img.save(buf, format='PNG')
-                    buf.seek(0)
-                    return StreamingResponse(buf, media_type='image/png')
-                else:
-                    # 没有有效结果，返回原图
-                    buf = io.BytesIO()
-                    img.save(buf, format='PNG')
-                    buf.seek(0)
-                    return StreamingResponse(buf, media_type='image/png')
-            else:
-                return JSONResponse(status_code=400, content={"error": "Invalid OCR result format - expected pipeline format with 'results' field"})
+        return await handler(file, ocr_data, form, out_format)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+@router.post("/draw")
+async def draw_ocr_result(file: UploadFile = File(...), form: dict = Depends(_draw_form)):
+    """
+    绘制OCR结果（仅支持pipeline格式），根据文件扩展名自动区分图像和PDF
+
+    Args:
+        file: 上传的图像文件或PDF文件
+        其余参数见 _draw_form
+    """
+    handler = _draw_pdf if _is_pdf_upload(file) else _draw_image
+    return await _run_draw(handler, file, form)
+
+
+@router.post("/draw/image")
+async def draw_image_result(file: UploadFile = File(...), form: dict = Depends(_draw_form)):
+    """绘制单张图像的OCR结果（不依赖文件名判断类型）"""
+    return await _run_draw(_draw_image, file, form)
+
+
+@router.post("/draw/pdf")
+async def draw_pdf_result(file: UploadFile = File(...), form: dict = Depends(_draw_form)):
+    """绘制PDF的OCR结果（不依赖文件名判断类型）"""
+    return await _run_draw(_draw_pdf, file, form)
+
+
 @router.post("/ocr2text")
 async def ocr_result_to_text(ocr_result: dict = Body(...)):
     """
@@ -401,23 +854,18 @@ async def ocr_result_to_text(ocr_result: dict = Body(...)):
         if not ocr_result or "results" not in ocr_result:
             return JSONResponse(status_code=400, content={"error": "Invalid OCR result format - expected pipeline format with 'results' field"})
 
-        all_text_lines = []
-
         # 仅支持pipeline格式
         results = ocr_result["results"]
         if not isinstance(results, list):
             return JSONResponse(status_code=400, content={"error": "Invalid OCR result format - 'results' should be a list"})
 
-        for result in results:
-            if isinstance(result, dict) and "text" in result:
-                text = result["text"]
-                confidence = result.get("text_confidence", 1.0)
-                if text.strip() and confidence >= 0.1:  # 可以根据需要调整阈值
-                    all_text_lines.append(text)
-
-        # 合并所有文本行
-        full_text = "\n".join(all_text_lines)
-        return {"text": full_text}
+        # 单次遍历提取并合并文本（可以根据需要调整置信度阈值），结果项按pipeline约定均为dict
+        full_text = "\n".join(
+            text for result in results
+            if (text := result.get("text", "")).strip()
+            and result.get("text_confidence", 1.0) >= MIN_TEXT_CONFIDENCE
+        )
+        return _json_response({"text": full_text})
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"文本提取失败: {str(e)}"})
@@ -431,43 +879,18 @@ async def load_model():
         if not HAS_PIPELINE:
             return JSONResponse(status_code=500, content={"error": "Pipeline功能不可用"})
 
-        # 检查模型文件是否存在
-        from pathlib import Path
-        models_dir = Path(get_work_dir())
-        # 注意：模型路径应该是目录路径，模型类会自动在内部拼接 /inference.onnx
-        det_model = models_dir / "models" / "PP-OCRv5_mobile_det-ONNX"
-        rec_model = models_dir / "models" / "PP-OCRv5_mobile_rec-ONNX"
-        cls_model = models_dir / "models" / "PP-LCNet_x1_0_doc_ori-ONNX"
-
-        # 检查模型目录内是否存在 inference.onnx 文件
-        missing_files = []
-        if not (det_model / "inference.onnx").exists():
-            missing_files.append("PP-OCRv5_mobile_det-ONNX/inference.onnx")
-        if not (rec_model / "inference.onnx").exists():
-            missing_files.append("PP-OCRv5_mobile_rec-ONNX/inference.onnx")
-        if not (cls_model / "inference.onnx").exists():
-            missing_files.append("PP-LCNet_x1_0_doc_ori-ONNX/inference.onnx")
+        # 检查模型文件是否存在（用户可能刚放入模型文件，重新检查）
+        _invalidate_models_exist()
+        missing_files = _missing_model_files()
 
         if missing_files:
             error_msg = f"模型文件不完整，缺少以下文件：\n" + "\n".join(f"  - {file}" for file in missing_files)
             return JSONResponse(status_code=500, content={"error": error_msg, "missing_files": missing_files})
 
-        # 获取或创建全局pipeline实例
-        pipeline = get_global_pipeline()
-        if pipeline is None:
-            pipeline = PPOCRv5Pipeline(
-                det_model_path=str(det_model),
-                rec_model_path=str(rec_model),
-                cls_model_path=str(cls_model),
-                use_gpu=False
-            )
-            set_global_pipeline(pipeline)
-
-        # 加载模型
-        if pipeline.load():
-            return {"message": "OCR模型加载成功", "loaded": True}
-        else:
-            return JSONResponse(status_code=500, content={"error": "模型加载失败", "loaded": False})
+        # 获取或创建全局pipeline实例并加载模型（已存在的pipeline直接加载）
+        models_key = None if get_global_pipeline() is not None else get_pipeline_models_key(*DEFAULT_MODEL_NAMES)
+        await run_in_threadpool(_ensure_pipeline, models_key, _create_default_pipeline)
+        return {"message": "OCR模型加载成功", "loaded": True}
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Failed to load models: {str(e)}"})
@@ -477,6 +900,7 @@ async def load_model():
 async def download_missing_models():
     """下载缺失的OCR模型（仅下载，不加载到内存）"""
     try:
+        _invalidate_models_exist()
         # 尝试获取所有模型路径，如果缺失会自动下载
         try:
             det_model = get_model_path_from_registry("PP-OCRv5_mobile_det-ONNX")
@@ -505,6 +929,7 @@ async def download_missing_models():
 async def unload_model_endpoint():
     """卸载OCR模型"""
     try:
+        clear_result_caches()
         pipeline = get_global_pipeline()
         if pipeline is not None:
             if pipeline.unload():
@@ -526,17 +951,7 @@ async def model_status():
             return {"loaded": False, "message": "Pipeline功能不可用"}
 
         # 检查模型文件是否存在
-        from pathlib import Path
-        models_dir = Path(get_work_dir())
-        # 注意：模型路径应该是目录路径，不需要加 /inference.onnx
-        det_model = models_dir / "models" / "PP-OCRv5_mobile_det-ONNX"
-        rec_model = models_dir / "models" / "PP-OCRv5_mobile_rec-ONNX"
-        cls_model = models_dir / "models" / "PP-LCNet_x1_0_doc_ori-ONNX"
-
-        # 检查模型目录内是否存在 inference.onnx 文件
-        models_exist = all([(det_model / "inference.onnx").exists(), 
-                           (rec_model / "inference.onnx").exists(), 
-                           (cls_model / "inference.onnx").exists()])
+        models_exist = _models_exist()
 
         if not models_exist:
             return {
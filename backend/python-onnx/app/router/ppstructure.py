@@ -1,11 +1,18 @@
 from fastapi import APIRouter, UploadFile, File, Form
-from fastapi.responses import JSONResponse
-from PIL import Image
-import io
-import json
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from functools import lru_cache, partial
+import logging
+import os
+import threading
+from pathlib import Path
 import numpy as np
 import base64
-import cv2
+from ..core.cache import LRUCache, hash_bytes
+from ..core.utils import decode_image, encode_image, rotate_by_angle, normalize_image_format, read_file_buffer, DRAW_MEDIA_TYPES, DefaultResponse, json_loads, json_dumps, json_dumps_sorted, upload_too_large, upload_too_large_response
 
 # 导入PDF处理库
 try:
@@ -23,6 +30,9 @@ except ImportError:
 
 from ..config import get_work_dir, get_pipeline_default_models, get_pipeline_model_options_by_name, get_model_path_from_registry
 
+# 请求处理路径上的日志默认不输出，参数在日志级别启用时才格式化（分析结果可能很大）
+logger = logging.getLogger(__name__)
+
 # 全局pipeline实例（用于保持加载状态）
 _global_pipeline = None
 
@@ -36,25 +46,529 @@ def set_global_pipeline(pipeline):
     global _global_pipeline
     _global_pipeline = pipeline
 
+# PP-StructureV3所需模型（布局检测、文本检测、文本识别、文档方向分类）
+STRUCTURE_MODEL_NAMES = ("PP-DocLayout-L-ONNX", "PP-OCRv5_mobile_det-ONNX", "PP-OCRv5_mobile_rec-ONNX", "PP-LCNet_x1_0_doc_ori-ONNX")
+_models_exist_cached = False
+
+@lru_cache(maxsize=1)
+def _model_paths():
+    """
+    PP-StructureV3模型目录路径（只解析一次）
+
+    注意：模型路径应该是目录路径，模型类会自动在内部拼接 /inference.onnx
+    """
+    models_dir = Path(get_work_dir()) / "models"
+    return tuple(models_dir / name for name in STRUCTURE_MODEL_NAMES)
+
+def _missing_model_files():
+    """检查模型目录内是否存在 inference.onnx 文件，返回缺失文件列表"""
+    return [
+        f"{name}/inference.onnx"
+        for name, path in zip(STRUCTURE_MODEL_NAMES, _model_paths())
+        if not (path / "inference.onnx").is_file()
+    ]
+
+def _models_exist():
+    """模型文件是否完整；确认完整后不再重复访问磁盘（前端会频繁轮询状态），遇到第一个缺失文件即停止检查"""
+    global _models_exist_cached
+    if not _models_exist_cached:
+        _models_exist_cached = all((path / "inference.onnx").is_file() for path in _model_paths())
+    return _models_exist_cached
+
+def _invalidate_models_exist():
+    """模型文件可能发生变化时清除缓存"""
+    global _models_exist_cached
+    _model_paths.cache_clear()
+    _models_exist_cached = False
+
+# 保护全局pipeline的创建、加载和卸载，避免并发的首次请求重复创建实例、重复加载模型。
+# 使用线程锁而非asyncio.Lock：启动预热在后台线程中加载模型，同样需要互斥；
+# /model_status 只读取全局变量，不需要加锁
+_pipeline_lock = threading.Lock()
+
+def _ensure_pipeline(create, blocking=True):
+    """
+    获取已加载模型的全局pipeline，必要时创建并加载
+
+    Args:
+        create: 创建pipeline实例的函数
+        blocking: 其他线程正在加载模型时是否等待；为False时直接返回None，由调用方快速失败
+    """
+    pipeline = get_global_pipeline()
+    if pipeline is not None and pipeline.is_loaded():
+        return pipeline
+
+    if not _pipeline_lock.acquire(blocking=blocking):
+        return None
+    try:
+        pipeline = get_global_pipeline()
+        if pipeline is None:
+            pipeline = create()
+            set_global_pipeline(pipeline)
+        if not pipeline.is_loaded():
+            success, error_msg = pipeline.load()
+            if not success:
+                raise RuntimeError(error_msg or "模型加载失败")
+        return pipeline
+    finally:
+        _pipeline_lock.release()
+
+def _unload_pipeline():
+    """卸载全局pipeline的模型，返回是否成功（没有pipeline时返回None）；与加载共用同一把锁，避免卸载和加载交错"""
+    with _pipeline_lock:
+        # 页面分析进程池的工作进程各自持有一份模型，一并关闭才能释放内存
+        _shutdown_page_process_pool()
+        pipeline = get_global_pipeline()
+        if pipeline is None:
+            return None
+        return pipeline.unload()
+
+def _create_default_pipeline():
+    """使用默认模型目录创建pipeline"""
+    layout_model_path, ocr_det_model, ocr_rec_model, ocr_cls_model = _model_paths()
+    return PPStructureV3Pipeline(
+        layout_model_path=str(layout_model_path),
+        ocr_det_model_path=str(ocr_det_model),
+        ocr_rec_model_path=str(ocr_rec_model),
+        ocr_cls_model_path=str(ocr_cls_model),
+        use_gpu=False
+    )
+
+def warmup_pipeline():
+    """
+    预热PP-StructureV3模型：加载默认模型并对空白小图执行一次分析，提前完成ONNX Runtime会话的初始化。
+    模型文件不完整时直接跳过。
+    """
+    if not HAS_PIPELINE or not _models_exist():
+        return
+    try:
+        pipeline = _ensure_pipeline(_create_default_pipeline)
+        pipeline.analyze_structure(np.full((64, 64, 3), 255, dtype=np.uint8))
+        logger.info("PP-StructureV3模型预热完成")
+    except Exception as e:
+        logger.warning("PP-StructureV3模型预热失败: %s", e)
+
+def _model_loading_response():
+    """模型正在加载（如启动预热中）时快速返回503，而不是让请求排队等待"""
+    return JSONResponse(status_code=503, content={"error": "模型正在加载中，请稍后重试"}, headers={"Retry-After": "5"})
+
+async def _require_pipeline():
+    """获取已初始化的全局pipeline（供 /draw 与 /markdown 使用），返回 (pipeline, 错误响应)"""
+    pipeline = get_global_pipeline()
+    if pipeline is None:
+        return None, JSONResponse(status_code=500, content={"error": "Pipeline未初始化"})
+    if pipeline.is_loaded():
+        return pipeline, None
+    try:
+        pipeline = await run_blocking(_ensure_pipeline, None, blocking=False)
+    except RuntimeError as e:
+        return None, JSONResponse(status_code=500, content={"error": str(e)})
+    if pipeline is None:
+        return None, _model_loading_response()
+    return pipeline, None
+
+# PyMuPDF渲染时会释放GIL：缓存未命中时（/draw、/markdown 重新渲染整份PDF）按连续页分组，
+# 在常驻的渲染线程池中并行渲染，并行数可通过环境变量 PDF_RENDER_WORKERS 配置（默认4）
+PDF_RENDER_WORKERS = max(1, min(int(os.getenv("PDF_RENDER_WORKERS", "4")), os.cpu_count() or 1))
+# 页数不超过该值时串行渲染，省去线程调度和重复打开文档的开销
+PDF_RENDER_SERIAL_PAGES = 2
+_pdf_render_executor = ThreadPoolExecutor(max_workers=PDF_RENDER_WORKERS, thread_name_prefix="ppstructure-render")
+
+def get_pdf_page_count(pdf_bytes):
+    """获取PDF页数（不渲染页面）"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
 def pdf_to_images_from_bytes(pdf_bytes, dpi=200):
-    """将PDF字节数据转换为图像列表"""
+    """将PDF字节数据转换为图像列表（多页时并行渲染）"""
     if not HAS_FITZ:
         raise RuntimeError("未安装pymupdf库，无法处理PDF文件。请先安装pymupdf。")
-    
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    images = []
-    for page in doc:
-        pix = page.get_pixmap(dpi=dpi)
-        img = np.frombuffer(pix.samples, dtype=np.uint8)
-        img = img.reshape((pix.height, pix.width, pix.n))
-        if pix.n == 4:
-            # 移除alpha通道
-            img = img[:, :, :3]
-        images.append(img)
-    doc.close()
+
+    page_indices = list(range(get_pdf_page_count(pdf_bytes)))
+    workers = min(PDF_RENDER_WORKERS, len(page_indices))
+    if workers <= 1 or len(page_indices) <= PDF_RENDER_SERIAL_PAGES:
+        return list(iter_pdf_pages(pdf_bytes, dpi=dpi))
+
+    # 每个线程独立打开文档（PyMuPDF文档对象不可跨线程共享），按连续页分组保证结果顺序
+    chunk_size = (len(page_indices) + workers - 1) // workers
+    chunks = [page_indices[i:i + chunk_size] for i in range(0, len(page_indices), chunk_size)]
+    rendered = _pdf_render_executor.map(lambda chunk: list(iter_pdf_pages(pdf_bytes, dpi=dpi, page_indices=chunk)), chunks)
+    return [img for chunk_images in rendered for img in chunk_images]
+
+# PDF渲染结果缓存：同一PDF在 / 、/draw 、/markdown 之间往往以相同分辨率渲染多次，
+# 渲染是最耗CPU的步骤之一，按(文件哈希, dpi)缓存页面图像，并按总字节数限制内存占用
+PDF_RENDER_CACHE_MB = int(os.getenv("PDF_RENDER_CACHE_MB", "512"))
+_pdf_page_cache = LRUCache(
+    max_size=8,
+    max_bytes=PDF_RENDER_CACHE_MB * 1024 * 1024,
+    sizeof=lambda images: sum(img.nbytes for img in images),
+)
+
+def get_pdf_pages(pdf_bytes, dpi=200, file_hash=None):
+    """获取PDF的页面图像列表，优先使用渲染缓存（页面图像只读，调用方不得原地修改）"""
+    key = (file_hash if file_hash is not None else hash_bytes(pdf_bytes), dpi)
+    images = _pdf_page_cache.get(key)
+    if images is None:
+        images = pdf_to_images_from_bytes(pdf_bytes, dpi=dpi)
+        _pdf_page_cache.put(key, images)
     return images
 
-router = APIRouter()
+def get_pdf_page(pdf_bytes, page_idx, dpi=200, file_hash=None):
+    """
+    获取PDF单页图像，返回 (图像, 总页数)，页码超出范围时图像为None
+
+    整份文档已在渲染缓存中时直接取用，否则只渲染需要的这一页
+    """
+    images = _pdf_page_cache.get((file_hash if file_hash is not None else hash_bytes(pdf_bytes), dpi))
+    if images is not None:
+        return (images[page_idx] if 0 <= page_idx < len(images) else None), len(images)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if not 0 <= page_idx < doc.page_count:
+            return None, doc.page_count
+        return _pixmap_to_array(doc.load_page(page_idx).get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)), doc.page_count
+
+def _pixmap_to_array(pix):
+    """将RGB pixmap转换为numpy图像（直接引用pixmap数据，只读）"""
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape((pix.height, pix.width, 3))
+
+def iter_pdf_pages(pdf_bytes, dpi=200, page_indices=None):
+    """逐页渲染PDF（page_indices为None时渲染全部页面），每渲染完一页即产出该页图像"""
+    # 使用with确保渲染出错时文档也会被关闭
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pages = doc if page_indices is None else (doc.load_page(page_idx) for page_idx in page_indices)
+        for page in pages:
+            # 直接渲染不带alpha通道的RGB图像，得到连续内存，无需再切片去除alpha
+            yield _pixmap_to_array(page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False))
+
+router = APIRouter(default_response_class=DefaultResponse)
+
+# 结构分析、可视化、Markdown生成以及模型加载都是阻塞的CPU密集操作（ONNX Runtime推理时释放GIL），
+# 放到线程池中执行，避免阻塞事件循环，其他请求在推理期间仍能得到响应
+_structure_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="ppstructure")
+
+async def run_blocking(func, *args, **kwargs):
+    """在线程池中执行阻塞函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_structure_executor, partial(func, *args, **kwargs))
+
+# 结构分析微批处理：短时间内到达的多张图像（并发请求或同一PDF的多页）合并为一个批次，
+# 布局检测模型一次推理整个批次；可通过环境变量调整批次大小和最长等待时间
+STRUCTURE_BATCH_SIZE = max(1, int(os.getenv("STRUCTURE_BATCH_SIZE", "4")))
+STRUCTURE_BATCH_WAIT_MS = float(os.getenv("STRUCTURE_BATCH_WAIT_MS", "8"))
+
+class _StructureBatcher:
+    """
+    结构分析微批处理队列
+
+    submit() 提交单张图像并等待结果；后台任务收集最多 max_batch 张图像或等待 max_wait 秒后，
+    按(pipeline, 分析参数)分组调用 pipeline.analyze_structure_batch，再把结果分发回各调用方。
+    """
+
+    def __init__(self, max_batch, max_wait):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._loop = None
+        self._queue = None
+        self._task = None
+        # 事件循环只保存任务的弱引用，分组任务需持有强引用直到完成，否则可能被回收，调用方永远等不到结果
+        self._group_tasks = set()
+
+    def _ensure_worker(self):
+        # 队列和后台任务绑定在当前事件循环上，事件循环变化时（如测试环境）重新创建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._worker())
+
+    async def submit(self, pipeline, img, params):
+        """提交一张图像进行结构分析，返回该图像的分析结果"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((pipeline, img, params, future))
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # 只有使用同一pipeline和相同参数的图像才能合并分析
+                groups = {}
+                for item in batch:
+                    pipeline, _, params, _ = item
+                    groups.setdefault((id(pipeline), tuple(sorted(params.items()))), []).append(item)
+                for items in groups.values():
+                    task = loop.create_task(self._run_group(items))
+                    self._group_tasks.add(task)
+                    task.add_done_callback(self._group_tasks.discard)
+            except Exception as e:
+                # 分组或分发失败时让本批次尚未完成的调用方收到异常，后台任务继续处理后续请求
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+
+    async def _run_group(self, items):
+        pipeline, _, params, _ = items[0]
+        try:
+            results = await run_blocking(pipeline.analyze_structure_batch, [item[1] for item in items], **params)
+        except Exception as e:
+            for item in items:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+        for item, result in zip(items, results):
+            if not item[3].done():
+                item[3].set_result(result)
+
+_structure_batcher = _StructureBatcher(STRUCTURE_BATCH_SIZE, STRUCTURE_BATCH_WAIT_MS / 1000)
+
+# 多页PDF的页面分析后端：默认与其他请求共用线程池和微批处理队列（ONNX Runtime推理时释放GIL）；
+# STRUCTURE_PAGE_BACKEND=process 时改用多进程并行分析各页，每个进程各自加载一份模型，内存占用成倍增加
+STRUCTURE_PAGE_BACKEND = os.getenv("STRUCTURE_PAGE_BACKEND", "thread").lower()
+STRUCTURE_PAGE_WORKERS = max(1, min(int(os.getenv("STRUCTURE_PAGE_WORKERS", "4")), os.cpu_count() or 1))
+_page_process_pool = None
+_page_process_pool_key = None
+_page_process_pool_lock = threading.Lock()
+_worker_pipeline = None
+
+def _init_page_worker(model_paths):
+    """工作进程初始化：加载一份pipeline；各进程内单线程推理，避免多个进程争抢CPU核心"""
+    global _worker_pipeline
+    from ..core.pp_onnx import onnx_model_base
+    onnx_model_base.ORT_INTRA_OP_THREADS = 1
+    layout_model_path, ocr_det_model, ocr_rec_model, ocr_cls_model = model_paths
+    _worker_pipeline = PPStructureV3Pipeline(
+        layout_model_path=layout_model_path,
+        ocr_det_model_path=ocr_det_model,
+        ocr_rec_model_path=ocr_rec_model,
+        ocr_cls_model_path=ocr_cls_model,
+        use_gpu=False
+    )
+    success, error_msg = _worker_pipeline.load()
+    if not success:
+        raise RuntimeError(error_msg or "模型加载失败")
+
+def _analyze_page_in_worker(img, params):
+    """在工作进程中分析单页图像"""
+    return _worker_pipeline.analyze_structure(img, **params)
+
+def _shutdown_page_process_pool(pool=None):
+    """
+    关闭页面分析进程池并重置，下次使用时重新创建
+
+    Args:
+        pool: 仅当当前进程池仍是该实例时才关闭（用于处理已损坏的进程池，避免误关新建的进程池）；为None时无条件关闭
+    """
+    global _page_process_pool, _page_process_pool_key
+    with _page_process_pool_lock:
+        if _page_process_pool is None or (pool is not None and _page_process_pool is not pool):
+            return
+        _page_process_pool.shutdown(wait=False, cancel_futures=True)
+        _page_process_pool = None
+        _page_process_pool_key = None
+
+def _get_page_process_pool(pipeline):
+    """获取页面分析进程池（按pipeline的模型路径创建，模型路径变化时关闭旧进程池并重新创建）"""
+    global _page_process_pool, _page_process_pool_key
+    model_paths = (pipeline.layout_model_path, pipeline.ocr_det_model_path,
+                   pipeline.ocr_rec_model_path, pipeline.ocr_cls_model_path)
+    with _page_process_pool_lock:
+        if _page_process_pool is not None and _page_process_pool_key != model_paths:
+            _page_process_pool.shutdown(wait=False, cancel_futures=True)
+            _page_process_pool = None
+        if _page_process_pool is None:
+            # 使用spawn：服务进程中已有ONNX Runtime线程，fork出的子进程可能死锁
+            _page_process_pool_key = model_paths
+            _page_process_pool = ProcessPoolExecutor(
+                max_workers=STRUCTURE_PAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_page_worker,
+                initargs=(model_paths,),
+            )
+        return _page_process_pool
+
+async def analyze_pdf_pages(pipeline, pdf_bytes, dpi, params):
+    """
+    PDF渲染与结构分析流水线化执行，返回 (页面图像列表, 各页分析结果列表)
+
+    后台线程逐页渲染，每渲染完一页立即提交到微批处理队列（或页面分析进程池）分析；
+    PyMuPDF渲染和ONNX Runtime推理都会释放GIL，后续页面的渲染与前面页面的分析重叠进行。
+    """
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue()
+    page_pool = None
+    if STRUCTURE_PAGE_BACKEND == "process":
+        page_pool = _get_page_process_pool(pipeline)
+        submit = lambda img: loop.run_in_executor(page_pool, _analyze_page_in_worker, img, params)
+    else:
+        submit = lambda img: _structure_batcher.submit(pipeline, img, params)
+
+    def render():
+        try:
+            for img in iter_pdf_pages(pdf_bytes, dpi=dpi):
+                loop.call_soon_threadsafe(pages.put_nowait, img)
+            loop.call_soon_threadsafe(pages.put_nowait, None)
+        except Exception as e:
+            loop.call_soon_threadsafe(pages.put_nowait, e)
+
+    render_future = loop.run_in_executor(_structure_executor, render)
+    images = []
+    analyses = []
+    try:
+        while True:
+            item = await pages.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            images.append(item)
+            analyses.append(asyncio.ensure_future(submit(item)))
+        await render_future
+        return images, await asyncio.gather(*analyses)
+    except BaseException as e:
+        for analysis in analyses:
+            analysis.cancel()
+        if isinstance(e, BrokenProcessPool):
+            # 工作进程初始化失败或异常退出后进程池不可再用，重置以便下次请求重新创建
+            _shutdown_page_process_pool(page_pool)
+        raise
+
+# 分析结果缓存：/ 返回token，/draw 和 /markdown 只传token即可，无需重新上传文件、回传分析结果JSON。
+# 原始文件和分析结果按token缓存，并按原始文件总字节数限制内存占用（超过上限的单个文件不缓存，token会直接过期）；
+# 解码/渲染后的图像体积大，只为最近几次分析保留，且单次不超过上限
+ANALYSIS_CACHE_SIZE = 16
+ANALYSIS_CACHE_MB = int(os.getenv("ANALYSIS_CACHE_MB", "256"))
+ANALYSIS_IMAGE_CACHE_SIZE = 2
+ANALYSIS_IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_analysis_cache = LRUCache(
+    max_size=ANALYSIS_CACHE_SIZE,
+    max_bytes=ANALYSIS_CACHE_MB * 1024 * 1024,
+    sizeof=lambda entry: len(entry["contents"]),
+)
+_analysis_image_cache = LRUCache(max_size=ANALYSIS_IMAGE_CACHE_SIZE)
+
+def _analysis_token(file_hash, dpi, params):
+    """根据文件哈希、渲染分辨率和分析参数生成token"""
+    key = (file_hash, dpi, tuple(sorted(params.items())))
+    return hash_bytes(repr(key).encode()).hex()
+
+def _cache_analysis(token, contents, filename, dpi, images, result):
+    """缓存分析结果及其输入，供 /draw 和 /markdown 通过token复用"""
+    _analysis_cache.put(token, {"contents": contents, "filename": filename, "dpi": dpi, "result": result})
+    if sum(img.nbytes for img in images) <= ANALYSIS_IMAGE_CACHE_MAX_BYTES:
+        _analysis_image_cache.put(token, images)
+
+# 绘制结果缓存：同一文件、同一分析结果重复绘制时直接返回编码好的图片
+DRAW_CACHE_SIZE = 16
+_draw_result_cache = LRUCache(max_size=DRAW_CACHE_SIZE)
+
+def _draw_cache_key(file_hash, page_idx, dpi, layout_regions, rotation, image_format):
+    """生成绘制结果缓存键（文件内容、页码、渲染分辨率、布局区域、旋转角度和输出格式）"""
+    payload = json_dumps_sorted({"regions": layout_regions, "rotation": rotation})
+    return (file_hash, page_idx, dpi, image_format, hash_bytes(payload))
+
+def _token_expired_response():
+    return JSONResponse(status_code=410, content={"error": "token无效或已过期，请重新上传文件并提供analysis_result"})
+
+# /markdown 的返回格式；markdown格式按固定大小分块流式返回，客户端可尽早开始接收
+MARKDOWN_OUT_FORMATS = ("json", "markdown")
+MARKDOWN_CHUNK_SIZE = 64 * 1024
+
+# Markdown中会被裁剪为图片的区域类型
+FIGURE_REGION_TYPES = frozenset({"figure", "image"})
+MARKDOWN_REGION_KEYS = ("text_regions", "table_regions", "formula_regions", "figure_regions")
+
+def _has_figure_regions(page_data):
+    """分析结果中是否包含需要裁剪为图片的区域"""
+    return any(
+        region.get("type") in FIGURE_REGION_TYPES
+        for key in MARKDOWN_REGION_KEYS
+        for region in page_data.get(key, [])
+    )
+
+async def _figure_pages(contents, dpi, figure_dpi, images, pages, page_idx=None):
+    """
+    返回用于生成Markdown的页面图像及其相对分析结果坐标的缩放比例
+
+    分析在较低分辨率下进行即可；只有指定了更高的figure_dpi且确有图片区域时，
+    才以figure_dpi重新渲染PDF，用于裁剪更清晰的图片；指定page_idx时只重新渲染该页
+    """
+    if figure_dpi <= dpi or not any(_has_figure_regions(page_data) for page_data in pages):
+        return images, 1.0
+    if page_idx is not None:
+        figure_image, _ = await run_blocking(get_pdf_page, contents, page_idx, figure_dpi)
+        figure_images = [figure_image] if figure_image is not None else []
+    else:
+        figure_images = await run_blocking(get_pdf_pages, contents, figure_dpi)
+    if len(figure_images) != len(images):
+        return images, 1.0
+    return figure_images, figure_dpi / dpi
+
+async def _draw_page(pipeline, img, page_data, image_format, cache_key):
+    """绘制单页的布局可视化结果并编码（结果写入绘制缓存），编码失败时抛出RuntimeError"""
+    # visualize 会在自己的BGR副本上绘制，不修改输入图像；未旋转时无需拷贝，编码时也无需再转换颜色
+    vis_image = rotate_by_angle(img, page_data.get('rotation', 0))
+    visualized_image = await run_blocking(pipeline.visualize, vis_image, page_data.get("layout_regions", []), to_bgr=True)
+    encoded_image = await run_blocking(encode_image, visualized_image, image_format, bgr=True)
+    _draw_result_cache.put(cache_key, encoded_image)
+    return encoded_image
+
+def _draw_page_entry(page_idx, total_pages, image_format, encoded_image):
+    """多页绘制结果中单页的返回内容"""
+    return {
+        'page_number': page_idx + 1,
+        'total_pages': total_pages,  # 返回实际总页数
+        'media_type': DRAW_MEDIA_TYPES[image_format],
+        'data': base64.b64encode(encoded_image).decode('ascii')
+    }
+
+async def _iter_draw_pages_ndjson(pipeline, header, limited_images, limited_pages, cached_pages, cache_keys, image_format):
+    """
+    逐页绘制并以NDJSON流式输出：首行为汇总信息，其后每行一页
+
+    每页输出后即释放其图像和base64数据，峰值内存与单页相当而与页数无关；
+    中途失败时输出一行 {"error": ...} 并结束
+    """
+    yield json_dumps(header) + b"\n"
+    for page_idx, (img, page_data) in enumerate(zip(limited_images, limited_pages)):
+        encoded_image = cached_pages[page_idx]
+        if encoded_image is None:
+            try:
+                encoded_image = await _draw_page(pipeline, img, page_data, image_format, cache_keys[page_idx])
+            except RuntimeError:
+                logger.error("第%d页图像编码失败", page_idx + 1)
+                yield json_dumps({"error": f"第{page_idx + 1}页图像编码失败"}) + b"\n"
+                return
+        yield json_dumps(_draw_page_entry(page_idx, header['total_pages'], image_format, encoded_image)) + b"\n"
+
+def _iter_markdown_chunks(markdown):
+    """将markdown文本按UTF-8编码后分块输出"""
+    view = memoryview(markdown.encode("utf-8"))
+    for start in range(0, len(view), MARKDOWN_CHUNK_SIZE):
+        yield bytes(view[start:start + MARKDOWN_CHUNK_SIZE])
+
+def _markdown_response(result_md, out_format):
+    """按请求的格式返回markdown生成结果"""
+    if out_format == "markdown":
+        return StreamingResponse(_iter_markdown_chunks(result_md.get("markdown", "")), media_type="text/markdown; charset=utf-8")
+    return result_md
+
+# 支持分析的文件类型
+SUPPORTED_SUFFIXES = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.pdf'})
+
+# PDF默认渲染分辨率（/、/draw、/markdown 需使用相同分辨率，布局坐标才能对齐）
+DEFAULT_PDF_DPI = 200
 
 @router.post("/")
 async def analyze_structure(
@@ -68,6 +582,7 @@ async def analyze_structure(
     layout_overlap_threshold: float = Form(0.9),
     use_cls: bool = Form(True),
     cls_thresh: float = Form(0.9),
+    dpi: int = Form(DEFAULT_PDF_DPI),
     layout_model: str = Form(None),
     ocr_det_model: str = Form(None),
     ocr_rec_model: str = Form(None),
@@ -86,16 +601,20 @@ async def analyze_structure(
         layout_overlap_threshold: 合并布局框的重叠度阈值
         use_cls: 是否启用文档方向检测
         cls_thresh: 方向检测置信度阈值
+        dpi: PDF渲染分辨率（默认200）
     """
     if not HAS_PIPELINE:
         return JSONResponse(status_code=500, content={"error": "Pipeline功能不可用，请检查依赖"})
 
-    contents = await file.read()
+    # 先检查文件类型和大小，不支持的文件无需读入内存
     filename = file.filename.lower() if file.filename else ""
-
-    # 检查是否为支持的文件类型
-    if not (filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')) or filename.endswith('.pdf')):
+    suffix = os.path.splitext(filename)[1]
+    if suffix not in SUPPORTED_SUFFIXES:
         return JSONResponse(status_code=400, content={"error": "Only image files (PNG, JPG, JPEG, BMP, TIFF) and PDF files are supported"})
+    if upload_too_large(file):
+        return upload_too_large_response()
+
+    contents = await run_blocking(read_file_buffer, file.file)
 
     try:
         # 处理默认模型配置
@@ -106,47 +625,42 @@ async def analyze_structure(
         actual_ocr_rec_model = ocr_rec_model if ocr_rec_model not in [None, "Default"] else defaults["ocr_rec"]
         actual_cls_model = cls_model if cls_model not in [None, "Default"] else defaults["doc_cls"]
         
-        # 获取或创建pipeline实例
-        pipeline = get_global_pipeline()
+        # 获取已加载的pipeline实例（必要时创建并加载）；模型正在被其他请求或启动预热加载时快速失败
+        try:
+            pipeline = await run_blocking(_ensure_pipeline, partial(PPStructureV3Pipeline, use_gpu=False, gpu_id=0), blocking=False)
+        except RuntimeError as e:
+            return JSONResponse(status_code=500, content={"error": str(e)})
         if pipeline is None:
-            pipeline = PPStructureV3Pipeline(use_gpu=False, gpu_id=0)
-            set_global_pipeline(pipeline)
+            return _model_loading_response()
 
-        # 确保模型已加载
-        if not pipeline.is_loaded():
-            if not pipeline.load():
-                return JSONResponse(status_code=500, content={"error": "模型加载失败"})
+        # 本次请求的分析参数
+        analyze_params = {
+            "layout_conf_threshold": layout_conf_threshold,
+            "ocr_conf_threshold": ocr_det_db_thresh,  # 使用检测阈值作为OCR阈值
+            "unclip_ratio": unclip_ratio,
+            "merge_overlaps": merge_overlaps,
+            "overlap_threshold": overlap_threshold,
+            "merge_layout": merge_layout,
+            "layout_overlap_threshold": layout_overlap_threshold,
+            "use_cls": use_cls,
+            "cls_thresh": cls_thresh,
+        }
 
         # 处理文件输入
-        if filename.endswith('.pdf'):
+        if suffix == '.pdf':
             # 处理PDF文件
             if not HAS_FITZ:
                 return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
             
             try:
-                images = pdf_to_images_from_bytes(contents, dpi=300)
+                # 边渲染边分析：每渲染完一页即提交，由微批处理队列合并为批次分析
+                images, page_results = await analyze_pdf_pages(pipeline, contents, dpi, analyze_params)
                 if not images:
                     return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
-                
-                # 处理多页PDF，对每一页分别进行分析
+                logger.debug("处理PDF文件：%s，共%d页", filename, len(images))
+
                 all_results = []
-                for page_idx, img in enumerate(images):
-                    print(f"处理PDF文件：{filename}，第{page_idx + 1}/{len(images)}页")
-                    
-                    # 对每一页进行结构分析
-                    page_result = pipeline.analyze_structure(
-                        img,
-                        layout_conf_threshold=layout_conf_threshold,
-                        ocr_conf_threshold=ocr_det_db_thresh,
-                        unclip_ratio=unclip_ratio,
-                        merge_overlaps=merge_overlaps,
-                        overlap_threshold=overlap_threshold,
-                        merge_layout=merge_layout,
-                        layout_overlap_threshold=layout_overlap_threshold,
-                        use_cls=use_cls,
-                        cls_thresh=cls_thresh
-                    )
-                    
+                for page_idx, page_result in enumerate(page_results):
                     # 添加页面信息
                     page_result['page_number'] = page_idx + 1
                     page_result['total_pages'] = len(images)
@@ -163,8 +677,15 @@ async def analyze_structure(
                         'total_pages': len(images),
                         'pages': all_results
                     }
+
+                file_hash = await run_blocking(hash_bytes, contents)
+                _pdf_page_cache.put((file_hash, dpi), images)
+                token = _analysis_token(file_hash, dpi, analyze_params)
+                _cache_analysis(token, contents, filename, dpi, images, result)
+                # 缓存中保存的是不含token的结果，返回浅拷贝，避免修改已缓存的字典
+                result = {**result, 'token': token}
                 
-                print("Structure Analysis Result:", result)
+                logger.debug("Structure Analysis Result: %s", result)
                 return result
                 
             except Exception as e:
@@ -172,26 +693,20 @@ async def analyze_structure(
         else:
             # 处理图像文件
             try:
-                img = Image.open(io.BytesIO(contents)).convert("RGB")
-                img = np.array(img)
+                img = await run_blocking(decode_image, contents)
             except Exception as e:
                 return JSONResponse(status_code=400, content={"error": f"图像处理失败: {str(e)}"})
 
-            # Run structure analysis on image
-            result = pipeline.analyze_structure(
-                img,
-                layout_conf_threshold=layout_conf_threshold,
-                ocr_conf_threshold=ocr_det_db_thresh,  # 使用检测阈值作为OCR阈值
-                unclip_ratio=unclip_ratio,
-                merge_overlaps=merge_overlaps,
-                overlap_threshold=overlap_threshold,
-                merge_layout=merge_layout,
-                layout_overlap_threshold=layout_overlap_threshold,
-                use_cls=use_cls,
-                cls_thresh=cls_thresh
-            )
+            # Run structure analysis on image（并发请求的图像会被合并为批次）
+            result = await _structure_batcher.submit(pipeline, img, analyze_params)
+
+            file_hash = await run_blocking(hash_bytes, contents)
+            token = _analysis_token(file_hash, dpi, analyze_params)
+            _cache_analysis(token, contents, filename, dpi, [img], result)
+            # 缓存中保存的是不含token的结果，返回浅拷贝，避免修改已缓存的字典
+            result = {**result, 'token': token}
 
-            print("Structure Analysis Result:", result)
+            logger.debug("Structure Analysis Result: %s", result)
 
             return result
 
@@ -200,10 +715,14 @@ async def analyze_structure(
 
 @router.post("/draw")
 async def draw_structure_result(
-    file: UploadFile = File(...),
-    analysis_result: str = Form(...),
+    file: UploadFile = File(None),
+    analysis_result: str = Form(None),
     page_number: int = Form(1),
-    max_pages: int = Form(2)
+    max_pages: int = Form(2),
+    dpi: int = Form(DEFAULT_PDF_DPI),
+    token: str = Form(None),
+    out_format: str = Form("png"),
+    stream: bool = Form(False)
 ):
     """
     绘制PP-StructureV3结果，对于多页PDF返回所有页面的图片列表
@@ -213,26 +732,47 @@ async def draw_structure_result(
         analysis_result: 完整结构分析结果的JSON字符串
         page_number: 对于单页PDF的可视化指定页码（仅在手动选择时使用）
         max_pages: 对于多页PDF，限制最多处理和返回的页面数（默认2页）
+        dpi: PDF渲染分辨率，应与分析时一致
+        token: 分析接口返回的token，有效时无需提供file和analysis_result
+        out_format: 输出图片格式，png（默认）或 jpeg（编码更快、体积更小）
+        stream: 多页PDF是否以NDJSON（application/x-ndjson）逐页流式返回：首行为汇总信息，其后每行一页
     """
     if not HAS_PIPELINE:
         return JSONResponse(status_code=500, content={"error": "Pipeline功能不可用"})
 
-    contents = await file.read()
-    filename = file.filename.lower() if file.filename else ""
+    image_format = normalize_image_format(out_format)
+    if image_format is None:
+        return JSONResponse(status_code=400, content={"error": f"不支持的输出格式: {out_format}，仅支持 png 或 jpeg"})
 
-    try:
-        # Parse analysis result
-        analysis_data = json.loads(analysis_result)
+    # 优先使用token对应的缓存：复用已上传的文件、分析结果以及解码/渲染好的图像
+    images = None
+    cached = _analysis_cache.get(token) if token else None
+    if cached is not None:
+        contents, filename, dpi = cached["contents"], cached["filename"], cached["dpi"]
+        analysis_data = cached["result"]
+        images = _analysis_image_cache.get(token)
+    elif file is None or analysis_result is None:
+        return _token_expired_response()
+    else:
+        # 解析analysis_result JSON字符串，格式错误属于请求错误，直接返回400（无需读取上传文件）
+        try:
+            analysis_data = json_loads(analysis_result)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": f"analysis_result不是有效的JSON: {str(e)}"})
+        if not isinstance(analysis_data, dict):
+            return JSONResponse(status_code=400, content={"error": "analysis_result格式无效"})
+        if upload_too_large(file):
+            return upload_too_large_response()
+        contents = await run_blocking(read_file_buffer, file.file)
+        filename = file.filename.lower() if file.filename else ""
 
-        # Get pipeline for visualization
-        pipeline = get_global_pipeline()
-        if pipeline is None:
-            return JSONResponse(status_code=500, content={"error": "Pipeline未初始化"})
+    try:
+        # 获取已加载模型的pipeline
+        pipeline, error_response = await _require_pipeline()
+        if error_response is not None:
+            return error_response
 
-        # 确保模型已加载
-        if not pipeline.is_loaded():
-            if not pipeline.load():
-                return JSONResponse(status_code=500, content={"error": "模型加载失败"})
+        file_hash = await run_blocking(hash_bytes, contents)
 
         # 处理多页PDF的情况
         if analysis_data.get('file_type') == 'pdf':
@@ -244,127 +784,120 @@ async def draw_structure_result(
             # 获取PDF的所有页面图像
             if not HAS_FITZ:
                 return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
-            
+
+            # 所有页面都已有缓存的绘制结果时，无需重新渲染PDF
+            limited_pages = pages[:max_pages]
+            cache_keys = [
+                _draw_cache_key(file_hash, page_idx, dpi, page_data.get("layout_regions", []), page_data.get('rotation', 0), image_format)
+                for page_idx, page_data in enumerate(limited_pages)
+            ]
+            cached_pages = [_draw_result_cache.get(key) for key in cache_keys]
+
             try:
-                images = pdf_to_images_from_bytes(contents, dpi=300)
-                if len(images) != len(pages):
+                if images is None and any(encoded is None for encoded in cached_pages):
+                    images = await run_blocking(get_pdf_pages, contents, dpi, file_hash)
+                if images is not None and len(images) != len(pages):
                     return JSONResponse(status_code=400, content={"error": f"PDF页面数({len(images)})与分析结果页面数({len(pages)})不匹配"})
             except Exception as e:
                 return JSONResponse(status_code=400, content={"error": f"PDF重新处理失败: {str(e)}"})
             
             # 限制处理的最大页面数
-            total_pages = len(images)
-            limited_pages = pages[:max_pages]
-            limited_images = images[:max_pages]
+            total_pages = len(pages)
+            limited_images = images[:max_pages] if images is not None else [None] * len(limited_pages)
             
-            print(f"PDF共有{total_pages}页，限制处理{max_pages}页，实际处理{len(limited_pages)}页")
+            logger.debug("PDF共有%d页，限制处理%d页，实际处理%d页", total_pages, max_pages, len(limited_pages))
             
+            header = {
+                'file_type': 'pdf',
+                'total_pages': total_pages,
+                'processed_pages': len(limited_pages),
+                'max_pages_limit': max_pages
+            }
+            if stream:
+                return StreamingResponse(
+                    _iter_draw_pages_ndjson(pipeline, header, limited_images, limited_pages, cached_pages, cache_keys, image_format),
+                    media_type="application/x-ndjson"
+                )
+
             # 为每一页绘制可视化结果
             all_drawn_images = []
             
             for page_idx, (img, page_data) in enumerate(zip(limited_images, limited_pages)):
-                print(f"绘制PDF第{page_idx + 1}页的可视化结果")
-                
-                # 获取该页的区域和旋转信息
-                layout_regions = page_data.get("layout_regions", [])
-                rotation = page_data.get('rotation', 0)
-                
-                print(f"  页面{page_idx + 1}：有{len(layout_regions)}个区域，旋转度数{rotation}°")
-                
-                # 根据旋转信息处理图像
-                if rotation == 90:
-                    vis_image = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-                elif rotation == 180:
-                    vis_image = cv2.rotate(img, cv2.ROTATE_180)
-                elif rotation == 270:
-                    vis_image = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-                else:
-                    vis_image = img.copy()
-                
-                # 可视化结果
-                visualized_image = pipeline.visualize(vis_image, layout_regions)
-                
-                # 转换为PNG字节
-                success, encoded_image = cv2.imencode('.png', cv2.cvtColor(visualized_image, cv2.COLOR_RGB2BGR))
-                if not success:
-                    print(f"  错误：第{page_idx + 1}页图像编码失败")
-                    return JSONResponse(status_code=500, content={"error": f"第{page_idx + 1}页图像编码失败"})
-                
-                # 转换为base64（encoded_image已经是numpy数组，直接转换）
-                image_base64 = base64.b64encode(encoded_image).decode('utf-8')
-                
-                print(f"  页面{page_idx + 1}编码完成，base64长度: {len(image_base64)}")
-                
-                all_drawn_images.append({
-                    'page_number': page_idx + 1,
-                    'total_pages': total_pages,  # 返回实际总页数
-                    'data': image_base64
-                })
+                logger.debug("绘制PDF第%d页的可视化结果（%d个区域，旋转%s°）", page_idx + 1, len(page_data.get("layout_regions", [])), page_data.get('rotation', 0))
+
+                encoded_image = cached_pages[page_idx]
+                if encoded_image is None:
+                    try:
+                        encoded_image = await _draw_page(pipeline, img, page_data, image_format, cache_keys[page_idx])
+                    except RuntimeError:
+                        logger.error("第%d页图像编码失败", page_idx + 1)
+                        return JSONResponse(status_code=500, content={"error": f"第{page_idx + 1}页图像编码失败"})
+
+                all_drawn_images.append(_draw_page_entry(page_idx, total_pages, image_format, encoded_image))
             
             # 返回JSON格式的多页图片列表
-            print(f"返回{len(all_drawn_images)}页的绘制结果（总共{total_pages}页）")
-            return {
-                'file_type': 'pdf',
-                'total_pages': total_pages,
-                'processed_pages': len(all_drawn_images),
-                'max_pages_limit': max_pages,
-                'images': all_drawn_images
-            }
+            logger.debug("返回%d页的绘制结果（总共%d页）", len(all_drawn_images), total_pages)
+            return {**header, 'images': all_drawn_images}
         
         else:
+            # 获取布局区域和旋转信息
+            layout_regions = analysis_data.get("layout_regions", [])
+            rotation = analysis_data.get('rotation', 0)
+
+            # 命中绘制结果缓存时无需解码图像和重新绘制
+            is_pdf = filename.endswith('.pdf')
+            cache_key = _draw_cache_key(file_hash, page_number - 1 if is_pdf else 0, dpi if is_pdf else None, layout_regions, rotation, image_format)
+            encoded_image = _draw_result_cache.get(cache_key)
+            if encoded_image is not None:
+                return Response(content=encoded_image, media_type=DRAW_MEDIA_TYPES[image_format])
+
             # 处理单个图像或单页PDF
-            if filename.endswith('.pdf'):
+            if is_pdf:
                 # 处理PDF文件
                 if not HAS_FITZ:
                     return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
                 
                 try:
-                    images = pdf_to_images_from_bytes(contents, dpi=300)
-                    if not images:
+                    # 选择指定的页面（从1开始计数）；没有token缓存的图像时只渲染该页
+                    if images is not None:
+                        page_count = len(images)
+                        img = images[page_number - 1] if 1 <= page_number <= page_count else None
+                    else:
+                        img, page_count = await run_blocking(get_pdf_page, contents, page_number - 1, dpi, file_hash)
+                    if page_count == 0:
                         return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
+                    if img is None:
+                        return JSONResponse(status_code=400, content={"error": f"页面编号无效。PDF共有{page_count}页，请求的是第{page_number}页"})
                     
-                    # 选择指定的页面（从1开始计数）
-                    if page_number < 1 or page_number > len(images):
-                        return JSONResponse(status_code=400, content={"error": f"页面编号无效。PDF共有{len(images)}页，请求的是第{page_number}页"})
-                    
-                    img = images[page_number - 1]  # 转换为0-based索引
-                    print(f"处理PDF文件：{filename}，可视化第{page_number}/{len(images)}页")
+                    logger.debug("处理PDF文件：%s，可视化第%d/%d页", filename, page_number, page_count)
                 except Exception as e:
                     return JSONResponse(status_code=400, content={"error": f"PDF处理失败: {str(e)}"})
             else:
                 # 处理图像文件
                 try:
-                    img = Image.open(io.BytesIO(contents)).convert("RGB")
-                    img = np.array(img)
+                    if images is not None:
+                        img = images[0]
+                    else:
+                        img = await run_blocking(decode_image, contents)
                 except Exception as e:
                     return JSONResponse(status_code=400, content={"error": f"图像处理失败: {str(e)}"})
 
-            # 获取布局区域和旋转信息
-            layout_regions = analysis_data.get("layout_regions", [])
-            rotation = analysis_data.get('rotation', 0)
-            
             # 根据旋转信息处理图像
-            if rotation == 90:
-                vis_image = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            elif rotation == 180:
-                vis_image = cv2.rotate(img, cv2.ROTATE_180)
-            elif rotation == 270:
-                vis_image = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-            else:
-                vis_image = img.copy()
+            # visualize 会在自己的BGR副本上绘制，不修改输入图像；未旋转时无需拷贝
+            vis_image = rotate_by_angle(img, rotation)
 
             # Visualize result
-            visualized_image = pipeline.visualize(vis_image, layout_regions)
+            visualized_image = await run_blocking(pipeline.visualize, vis_image, layout_regions, to_bgr=True)
 
             # Convert to bytes
-            success, encoded_image = cv2.imencode('.png', cv2.cvtColor(visualized_image, cv2.COLOR_RGB2BGR))
-            if not success:
+            try:
+                encoded_image = await run_blocking(encode_image, visualized_image, image_format, bgr=True)
+            except RuntimeError:
                 return JSONResponse(status_code=500, content={"error": "Failed to encode image"})
+            _draw_result_cache.put(cache_key, encoded_image)
 
-            # Return as streaming response for single image
-            from fastapi.responses import StreamingResponse
-            buf = io.BytesIO(encoded_image.tobytes())
-            return StreamingResponse(buf, media_type='image/png')
+            # 编码结果已是完整字节，直接返回，无需再包装成流
+            return Response(content=encoded_image, media_type=DRAW_MEDIA_TYPES[image_format])
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -372,8 +905,12 @@ async def draw_structure_result(
 
 @router.post("/markdown")
 async def generate_markdown(
-    file: UploadFile = File(...),
-    analysis_result: str = Form(...)
+    file: UploadFile = File(None),
+    analysis_result: str = Form(None),
+    dpi: int = Form(DEFAULT_PDF_DPI),
+    token: str = Form(None),
+    out_format: str = Form("json"),
+    figure_dpi: int = Form(0)
 ):
     """
     根据PP-StructureV3完整分析结果生成Markdown文档
@@ -381,17 +918,40 @@ async def generate_markdown(
     Args:
         file: 上传的图像文件或PDF文件
         analysis_result: 完整结构分析结果的JSON字符串
+        dpi: PDF渲染分辨率，应与分析时一致
+        token: 分析接口返回的token，有效时无需提供file和analysis_result
+        out_format: 返回格式，json（默认，包含markdown和图片）或 markdown（分块流式返回纯文本，不含图片数据）
+        figure_dpi: 裁剪PDF中图片区域使用的渲染分辨率；大于dpi时以该分辨率重新渲染页面裁剪图片（默认0，与dpi一致）
     """
     if not HAS_PIPELINE:
         return JSONResponse(status_code=500, content={"error": "Pipeline功能不可用"})
 
-    contents = await file.read()
-    filename = file.filename.lower() if file.filename else ""
+    if out_format not in MARKDOWN_OUT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"不支持的返回格式: {out_format}，仅支持 json 或 markdown"})
 
-    try:
-        # Parse analysis result
-        analysis_data = json.loads(analysis_result)
+    # 优先使用token对应的缓存：复用已上传的文件、分析结果以及解码/渲染好的图像
+    images = None
+    cached = _analysis_cache.get(token) if token else None
+    if cached is not None:
+        contents, filename, dpi = cached["contents"], cached["filename"], cached["dpi"]
+        analysis_data = cached["result"]
+        images = _analysis_image_cache.get(token)
+    elif file is None or analysis_result is None:
+        return _token_expired_response()
+    else:
+        # 解析analysis_result JSON字符串，格式错误属于请求错误，直接返回400（无需读取上传文件）
+        try:
+            analysis_data = json_loads(analysis_result)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": f"analysis_result不是有效的JSON: {str(e)}"})
+        if not isinstance(analysis_data, dict):
+            return JSONResponse(status_code=400, content={"error": "analysis_result格式无效"})
+        if upload_too_large(file):
+            return upload_too_large_response()
+        contents = await run_blocking(read_file_buffer, file.file)
+        filename = file.filename.lower() if file.filename else ""
 
+    try:
         # 处理多页PDF的情况
         if analysis_data.get('file_type') == 'pdf':
             # 多页PDF结果
@@ -404,21 +964,18 @@ async def generate_markdown(
                 return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
             
             try:
-                images = pdf_to_images_from_bytes(contents, dpi=300)
+                if images is None:
+                    images = await run_blocking(get_pdf_pages, contents, dpi)
                 if len(images) != len(pages):
                     return JSONResponse(status_code=400, content={"error": f"PDF页面数({len(images)})与分析结果页面数({len(pages)})不匹配"})
+                images, crop_scale = await _figure_pages(contents, dpi, figure_dpi, images, pages)
             except Exception as e:
                 return JSONResponse(status_code=400, content={"error": f"PDF重新处理失败: {str(e)}"})
             
-            # Get pipeline for markdown generation
-            pipeline = get_global_pipeline()
-            if pipeline is None:
-                return JSONResponse(status_code=500, content={"error": "Pipeline未初始化"})
-            
-            # 确保模型已加载
-            if not pipeline.is_loaded():
-                if not pipeline.load():
-                    return JSONResponse(status_code=500, content={"error": "模型加载失败"})
+            # 获取已加载模型的pipeline
+            pipeline, error_response = await _require_pipeline()
+            if error_response is not None:
+                return error_response
             
             # 为每一页生成markdown内容
             all_markdown_parts = []
@@ -426,10 +983,10 @@ async def generate_markdown(
             image_counter = 0
             
             for page_idx, (img, page_data) in enumerate(zip(images, pages)):
-                print(f"生成PDF第{page_idx + 1}页的markdown内容")
+                logger.debug("生成PDF第%d页的markdown内容", page_idx + 1)
                 
                 # 为每一页生成markdown
-                page_result = pipeline.result_to_markdown(img, page_data)
+                page_result = await run_blocking(pipeline.result_to_markdown, img, page_data, crop_scale=crop_scale)
                 page_markdown = page_result.get('markdown', '')
                 page_images = page_result.get('images', [])
                 
@@ -453,58 +1010,56 @@ async def generate_markdown(
             # 合并所有markdown内容
             final_markdown = ''.join(all_markdown_parts)
             
-            return {
+            return _markdown_response({
                 'markdown': final_markdown,
                 'images': all_images
-            }
+            }, out_format)
         
         else:
             # 单页处理（图像文件或单页PDF）
             # 处理文件输入
+            crop_scale = 1.0
             if filename.endswith('.pdf'):
                 # 处理PDF文件
                 if not HAS_FITZ:
                     return JSONResponse(status_code=400, content={"error": "未安装pymupdf库，无法处理PDF文件"})
                 
                 try:
-                    images = pdf_to_images_from_bytes(contents, dpi=300)
-                    if not images:
+                    # 只需要第1页：没有token缓存的图像时只渲染该页
+                    if images is not None:
+                        img_array, page_count = (images[0] if images else None), len(images)
+                    else:
+                        img_array, page_count = await run_blocking(get_pdf_page, contents, 0, dpi)
+                    if img_array is None:
                         return JSONResponse(status_code=400, content={"error": "PDF文件没有有效页面"})
-                    
-                    img_array = images[0]
-                    print(f"处理PDF文件：{filename}，共{len(images)}页，使用第1页")
+                    figure_images, crop_scale = await _figure_pages(contents, dpi, figure_dpi, [img_array], [analysis_data], page_idx=0)
+                    img_array = figure_images[0]
+                    logger.debug("处理PDF文件：%s，共%d页，使用第1页", filename, page_count)
                 except Exception as e:
                     return JSONResponse(status_code=400, content={"error": f"PDF处理失败: {str(e)}"})
             else:
                 # 处理图像文件
                 try:
-                    img = Image.open(io.BytesIO(contents)).convert("RGB")
-                    img_array = np.array(img)
+                    if images is not None:
+                        img_array = images[0]
+                    else:
+                        img_array = await run_blocking(decode_image, contents)
                 except Exception as e:
                     return JSONResponse(status_code=400, content={"error": f"图像处理失败: {str(e)}"})
 
-            # Get pipeline for markdown generation
-            pipeline = get_global_pipeline()
-            if pipeline is None:
-                return JSONResponse(status_code=500, content={"error": "Pipeline未初始化"})
-
-            # 确保模型已加载
-            if not pipeline.is_loaded():
-                if not pipeline.load():
-                    return JSONResponse(status_code=500, content={"error": "模型加载失败"})
+            # 获取已加载模型的pipeline
+            pipeline, error_response = await _require_pipeline()
+            if error_response is not None:
+                return error_response
 
             # Delegate to pipeline to create markdown directly from analysis result
             try:
-                print(f"Calling result_to_markdown with image shape: {img_array.shape}")
-                print(f"Analysis data keys: {list(analysis_data.keys())}")
-                result_md = pipeline.result_to_markdown(img_array, analysis_data)
-                print(f"Generated markdown length: {len(result_md.get('markdown', ''))}")
-                print(f"Markdown preview: {result_md.get('markdown', '')[:200]}")
-                return result_md
+                logger.debug("Calling result_to_markdown with image shape: %s, analysis data keys: %s", img_array.shape, analysis_data.keys())
+                result_md = await run_blocking(pipeline.result_to_markdown, img_array, analysis_data, crop_scale=crop_scale)
+                logger.debug("Generated markdown length: %d", len(result_md.get('markdown', '')))
+                return _markdown_response(result_md, out_format)
             except Exception as e:
-                print(f"Error in result_to_markdown: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("result_to_markdown failed")
                 return JSONResponse(status_code=500, content={"error": f"Failed to generate markdown: {str(e)}"})
 
     except Exception as e:
@@ -519,47 +1074,19 @@ async def load_model():
         if not HAS_PIPELINE:
             return JSONResponse(status_code=500, content={"error": "Pipeline功能不可用"})
 
-        # 检查模型文件是否存在
-        from pathlib import Path
-        models_dir = Path(get_work_dir())
-        # 注意：模型路径应该是目录路径，模型类会自动在内部拼接 /inference.onnx
-        layout_model_path = models_dir / "models" / "PP-DocLayout-L-ONNX"
-        ocr_det_model = models_dir / "models" / "PP-OCRv5_mobile_det-ONNX"
-        ocr_rec_model = models_dir / "models" / "PP-OCRv5_mobile_rec-ONNX"
-        ocr_cls_model = models_dir / "models" / "PP-LCNet_x1_0_doc_ori-ONNX"
-
-        # 检查模型目录内是否存在 inference.onnx 文件
-        missing_files = []
-        if not (layout_model_path / "inference.onnx").exists():
-            missing_files.append("PP-DocLayout-L-ONNX/inference.onnx")
-        if not (ocr_det_model / "inference.onnx").exists():
-            missing_files.append("PP-OCRv5_mobile_det-ONNX/inference.onnx")
-        if not (ocr_rec_model / "inference.onnx").exists():
-            missing_files.append("PP-OCRv5_mobile_rec-ONNX/inference.onnx")
-        if not (ocr_cls_model / "inference.onnx").exists():
-            missing_files.append("PP-LCNet_x1_0_doc_ori-ONNX/inference.onnx")
-
+        # 检查模型文件是否存在（用户可能刚下载或删除了模型，重新检查）
+        _invalidate_models_exist()
+        missing_files = _missing_model_files()
         if missing_files:
             error_msg = f"模型文件不完整，缺少以下文件：\n" + "\n".join(f"  - {file}" for file in missing_files)
             return JSONResponse(status_code=500, content={"error": error_msg, "missing_files": missing_files})
 
-        # 获取或创建全局pipeline实例
-        pipeline = get_global_pipeline()
-        if pipeline is None:
-            pipeline = PPStructureV3Pipeline(
-                layout_model_path=str(layout_model_path),
-                ocr_det_model_path=str(ocr_det_model),
-                ocr_rec_model_path=str(ocr_rec_model),
-                ocr_cls_model_path=str(ocr_cls_model),
-                use_gpu=False
-            )
-            set_global_pipeline(pipeline)
-
-        # 加载模型
-        if pipeline.load():
-            return {"message": "PP-StructureV3模型加载成功", "loaded": True}
-        else:
-            return JSONResponse(status_code=500, content={"error": "模型加载失败", "loaded": False})
+        # 获取或创建全局pipeline实例并加载模型
+        try:
+            await run_blocking(_ensure_pipeline, _create_default_pipeline)
+        except RuntimeError as e:
+            return JSONResponse(status_code=500, content={"error": str(e), "loaded": False})
+        return {"message": "PP-StructureV3模型加载成功", "loaded": True}
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Failed to load models: {str(e)}"})
@@ -589,6 +1116,7 @@ async def download_missing_models():
                 error_msg = f"模型下载失败，无法获取：{', '.join(missing)}"
                 return JSONResponse(status_code=500, content={"error": error_msg})
             
+            _invalidate_models_exist()
             return {"message": "所有模型文件下载完成", "downloaded": True}
         except Exception as e:
             return JSONResponse(status_code=500, content={"error": f"模型下载过程中出错：{str(e)}"})
@@ -600,14 +1128,12 @@ async def download_missing_models():
 async def unload_model_endpoint():
     """卸载PP-StructureV3模型"""
     try:
-        pipeline = get_global_pipeline()
-        if pipeline is not None:
-            if pipeline.unload():
-                return {"message": "PP-StructureV3模型卸载成功", "loaded": False}
-            else:
-                return JSONResponse(status_code=500, content={"error": "模型卸载失败"})
-        else:
+        unloaded = await run_blocking(_unload_pipeline)
+        if unloaded is None:
             return {"message": "没有已加载的模型", "loaded": False}
+        if unloaded:
+            return {"message": "PP-StructureV3模型卸载成功", "loaded": False}
+        return JSONResponse(status_code=500, content={"error": "模型卸载失败"})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Failed to unload model: {str(e)}"})
 
@@ -621,19 +1147,7 @@ async def model_status():
             return {"loaded": False, "message": "Pipeline功能不可用"}
 
         # 检查模型文件是否存在
-        from pathlib import Path
-        models_dir = Path(get_work_dir())
-        # 注意：模型路径应该是目录路径，不需要加 /inference.onnx
-        layout_model_path = models_dir / "models" / "PP-DocLayout-L-ONNX"
-        ocr_det_model = models_dir / "models" / "PP-OCRv5_mobile_det-ONNX"
-        ocr_rec_model = models_dir / "models" / "PP-OCRv5_mobile_rec-ONNX"
-        ocr_cls_model = models_dir / "models" / "PP-LCNet_x1_0_doc_ori-ONNX"
-
-        # 检查模型目录内是否存在 inference.onnx 文件
-        models_exist = all([(layout_model_path / "inference.onnx").exists(), 
-                           (ocr_det_model / "inference.onnx").exists(), 
-                           (ocr_rec_model / "inference.onnx").exists(), 
-                           (ocr_cls_model / "inference.onnx").exists()])
+        models_exist = _models_exist()
 
         if not models_exist:
             return {
@@ -27,6 +27,7 @@ a = Analysis(
         'pdf2image',
         'python-multipart',
         'fitz',  # pymupdf
+        'orjson',
         'requests',
         'modelscope',
         'shutil',
@@ -10,24 +10,18 @@ import socket
 import json
 import os
 import sys
-import random
+import multiprocessing
 from pathlib import Path
 
 
 def find_random_available_port(min_port=1024, max_port=65535):
-    """随机查找可用的端口，避免固定端口范围"""
-    # 随机打乱端口顺序
-    ports = list(range(min_port, max_port + 1))
-    random.shuffle(ports)
-
-    for port in ports[:100]:  # 只尝试前100个随机端口
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('127.0.0.1', port))
-                return port
-        except OSError:
-            continue
-    raise RuntimeError("No available ports found in random selection")
+    """由操作系统分配一个可用的临时端口（绑定端口0），端口需落在[min_port, max_port]范围内"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    if not min_port <= port <= max_port:
+        raise RuntimeError(f"Assigned port {port} is outside the range {min_port}-{max_port}")
+    return port
 
 
 def save_port_info(port):
@@ -61,10 +55,8 @@ def main():
     backend_port = find_random_available_port(1024, 65535)
 
     print(f"[INFO] Starting PaddleOCR backend on port {backend_port}")
-    print(f"[PORT] Backend port allocated: {backend_port}", flush=True)
-    sys.stderr.write(f"[PORT] Backend port allocated: {backend_port}\n")
-    sys.stderr.flush()
-    sys.stderr.flush()
+    # 前端同时解析stdout和stderr中的 [PORT] 标记，写入一次并立即刷新即可
+    print(f"[PORT] Backend port allocated: {backend_port}", file=sys.stderr, flush=True)
 
     # 保存端口信息到文件（备用方案）
     try:
@@ -88,4 +80,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用多进程（如 PDF_RENDER_BACKEND=process）时需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
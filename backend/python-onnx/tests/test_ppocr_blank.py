@@ -0,0 +1,14 @@
+import numpy as np
+
+from app.router.ppocr import _is_blank
+
+
+def test_light_gray_text_line_is_not_blank():
+    page = np.full((2000, 1500, 3), 255, dtype=np.uint8)
+    page[1000, 200:1300] = 230  # 一行1像素高的浅灰色细笔画
+    assert not _is_blank(page)
+
+
+def test_constant_and_tiny_images_are_blank():
+    assert _is_blank(np.full((2000, 1500, 3), 255, dtype=np.uint8))
+    assert _is_blank(np.zeros((4, 300, 3), dtype=np.uint8))
@@ -204,7 +204,7 @@ function OCRV5Page() {
               console.log(`Processing ${drawData.images.length} images for PDF`)
               const drawImages = drawData.images.map((img: any, idx: number) => {
                 console.log(`Image ${idx + 1}: page_number=${img.page_number}, data_length=${img.data?.length || 0}`)
-                return `data:image/png;base64,${img.data}`
+                return `data:${img.media_type || 'image/png'};base64,${img.data}`
               })
               console.log(`Setting ${drawImages.length} images`)
               
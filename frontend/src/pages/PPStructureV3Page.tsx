@@ -203,14 +203,32 @@ function PPStructureV3Page() {
         return
       }
 
+      // 优先只传分析接口返回的token，后端复用已缓存的文件和分析结果；token过期（410）时回退为上传文件和结果
+      const postAnalysis = async (endpoint: string) => {
+        const buildFormData = (useToken: boolean) => {
+          const formData = new FormData()
+          if (useToken) {
+            formData.append('token', analysisResult.token)
+          } else {
+            formData.append('file', file)
+            formData.append('analysis_result', JSON.stringify(analysisResult))
+          }
+          if (endpoint === 'draw') {
+            // 可视化结果使用JPEG，编码更快、传输体积更小
+            formData.append('out_format', 'jpeg')
+          }
+          return formData
+        }
+        const url = `${apiBaseUrl}/api/ppstructure/${endpoint}`
+        const response = await fetch(url, { method: 'POST', body: buildFormData(!!analysisResult.token) })
+        if (response.status === 410 && analysisResult.token) {
+          return fetch(url, { method: 'POST', body: buildFormData(false) })
+        }
+        return response
+      }
+
       // Fetch markdown content
-      const markdownFormData = new FormData()
-      markdownFormData.append('file', file)
-      markdownFormData.append('analysis_result', JSON.stringify(analysisResult))
-      const markdownResponse = await fetch(`${apiBaseUrl}/api/ppstructure/markdown`, {
-        method: 'POST',
-        body: markdownFormData,
-      })
+      const markdownResponse = await postAnalysis('markdown')
       if (markdownResponse.ok) {
         const markdownData = await markdownResponse.json()
         console.log('Markdown data received:', markdownData)
@@ -241,13 +259,7 @@ function PPStructureV3Page() {
       }
 
       // Fetch drawn image
-      const drawFormData = new FormData()
-      drawFormData.append('file', file)
-      drawFormData.append('analysis_result', JSON.stringify(analysisResult))
-      const drawResponse = await fetch(`${apiBaseUrl}/api/ppstructure/draw`, {
-        method: 'POST',
-        body: drawFormData,
-      })
+      const drawResponse = await postAnalysis('draw')
       if (drawResponse.ok) {
         const contentType = drawResponse.headers.get('content-type')
         console.log('Draw response content-type:', contentType)
@@ -269,7 +281,7 @@ function PPStructureV3Page() {
               console.log(`Processing ${drawData.images.length} images for PDF`)
               const drawImages = drawData.images.map((img: any, idx: number) => {
                 console.log(`Image ${idx + 1}: page_number=${img.page_number}, data_length=${img.data?.length || 0}`)
-                return `data:image/png;base64,${img.data}`
+                return `data:${img.media_type || 'image/png'};base64,${img.data}`
               })
               console.log(`Setting ${drawImages.length} images`)
               
@@ -292,7 +304,7 @@ function PPStructureV3Page() {
               setDrawnImage(drawImages)
             }
           } else {
-            // 单页或图像文件 - blob格式（PNG图片流）
+            // 单页或图像文件 - blob格式（图片流）
             console.log('Processing as blob (single image)')
             const blob = await drawResponse.blob()
             const imageUrl = URL.createObjectURL(blob)
@@ -11,8 +11,14 @@ import json
 from . import utils
 
 class PPStructureONNXPipeline:
-    def __init__(self, model_dir='models/pp_structure_v3_onnx'):
+    def __init__(self, model_dir='models/pp_structure_v3_onnx', providers=None):
         self.model_dir = Path(__file__).parent.parent / model_dir
+        # Default: GPU providers (CUDA / DirectML) first when this onnxruntime build has them, then CPU
+        if providers is None:
+            available = ort.get_available_providers()
+            providers = [p for p in ('CUDAExecutionProvider', 'DmlExecutionProvider') if p in available]
+            providers.append('CPUExecutionProvider')
+        self.providers = providers
         self.models = {}
         self.utils = utils  # Add utils reference
 
@@ -33,8 +39,8 @@ class PPStructureONNXPipeline:
         for name, path in model_configs.items():
             model_path = self.model_dir / path
             if model_path.exists():
-                self.models[name] = ort.InferenceSession(str(model_path))
-                print(f"Loaded {name} model")
+                self.models[name] = ort.InferenceSession(str(model_path), providers=self.providers)
+                print(f"Loaded {name} model ({', '.join(self.models[name].get_providers())})")
             else:
                 print(f"Warning: {name} model not found at {model_path}")
 
@@ -6,6 +6,13 @@ import cv2
 import numpy as np
 from typing import Tuple, List
 
+# ImageNet mean/std shared by the layout and OCR models, folded into one
+# per-channel scale and bias: (x / 255 - mean) / std == x * _SCALE + _BIAS
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+_SCALE = (np.float32(1.0 / 255.0) / _STD).reshape(3, 1, 1)
+_BIAS = (-_MEAN / _STD).reshape(3, 1, 1)
+
 def resize_image(image: np.ndarray, target_size: Tuple[int, int] = (640, 640)) -> Tuple[np.ndarray, float, Tuple[int, int]]:
     """Resize image maintaining aspect ratio with padding.
 
@@ -20,20 +27,41 @@ def resize_image(image: np.ndarray, target_size: Tuple[int, int] = (640, 640)) -
     new_w, new_h = int(w * scale), int(h * scale)
     resized = cv2.resize(image, (new_w, new_h))
 
-    # Create canvas (height, width, channels) and center the image
-    canvas = np.zeros((target_h, target_w, 3), dtype=np.uint8)
+    # Center the image by padding it with black borders; this writes each
+    # canvas pixel once instead of zero-filling a canvas and copying over it
     x_offset = (target_w - new_w) // 2
     y_offset = (target_h - new_h) // 2
-    canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+    canvas = cv2.copyMakeBorder(resized, y_offset, target_h - new_h - y_offset,
+                                x_offset, target_w - new_w - x_offset,
+                                cv2.BORDER_CONSTANT, value=(0, 0, 0))
 
     return canvas, scale, (x_offset, y_offset)
 
 def normalize_image(image: np.ndarray, mean: List[float] = [0.485, 0.456, 0.406],
                    std: List[float] = [0.229, 0.224, 0.225]) -> np.ndarray:
-    """Normalize image for model input"""
-    image = image.astype(np.float32) / 255.0
-    image = (image - mean) / std
-    return image
+    """Normalize image for model input (float32, /255 and mean/std folded into one scale and bias)"""
+    std = np.asarray(std, dtype=np.float32)
+    scale = np.float32(1.0 / 255.0) / std
+    bias = -np.asarray(mean, dtype=np.float32) / std
+    normalized = image.astype(np.float32)
+    normalized *= scale
+    normalized += bias
+    return normalized
+
+def to_batch_chw(image: np.ndarray) -> np.ndarray:
+    """Normalize an HWC uint8 image straight into a [1, 3, H, W] float32 tensor.
+
+    The layout change, scaling and mean/std normalization all write into one
+    preallocated buffer, instead of building a normalized HWC copy that is
+    then transposed and copied again.
+    """
+    h, w = image.shape[:2]
+    batch_chw = np.empty((1, 3, h, w), dtype=np.float32)
+    chw = batch_chw[0]
+    chw[...] = image.transpose(2, 0, 1)
+    chw *= _SCALE
+    chw += _BIAS
+    return batch_chw
 
 def preprocess_for_layout(image: np.ndarray, target_size: Tuple[int, int] = (640, 640)) -> Tuple[dict, float, Tuple[int, int]]:
     """Complete preprocessing for layout detection - returns dict of inputs
@@ -42,10 +70,7 @@ def preprocess_for_layout(image: np.ndarray, target_size: Tuple[int, int] = (640
     and that offset is returned in canvas coordinate system (x_offset, y_offset).
     """
     resized, scale, offset = resize_image(image, target_size)
-    normalized = normalize_image(resized)
-    # To CHW
-    chw = np.transpose(normalized, (2, 0, 1))
-    batch_chw = np.expand_dims(chw, 0).astype(np.float32)
+    batch_chw = to_batch_chw(resized)
 
     # Calculate im_shape and scale_factor (height, width)
     original_h, original_w = image.shape[:2]
@@ -63,10 +88,7 @@ def preprocess_for_layout(image: np.ndarray, target_size: Tuple[int, int] = (640
 def preprocess_for_ocr_det(image: np.ndarray, target_size: Tuple[int, int] = (640, 640)) -> np.ndarray:
     """Preprocessing for OCR detection - returns tensor with key 'x'"""
     resized, scale, offset = resize_image(image, target_size)
-    normalized = normalize_image(resized)
-    # To CHW
-    chw = np.transpose(normalized, (2, 0, 1))
-    return np.expand_dims(chw, 0).astype(np.float32)
+    return to_batch_chw(resized)
 
 def preprocess_for_ocr_rec(image: np.ndarray, target_height: int = 48) -> np.ndarray:
     """Preprocessing for OCR recognition - resize to fixed height, returns tensor with key 'x'"""
@@ -74,12 +96,7 @@ def preprocess_for_ocr_rec(image: np.ndarray, target_height: int = 48) -> np.nda
     scale = target_height / h
     new_w = int(w * scale)
     resized = cv2.resize(image, (new_w, target_height))
-
-    # Normalize
-    normalized = normalize_image(resized)
-    # To CHW
-    chw = np.transpose(normalized, (2, 0, 1))
-    return np.expand_dims(chw, 0).astype(np.float32)
+    return to_batch_chw(resized)
 
 def postprocess_layout(outputs: list, scale: float, offset: Tuple[int, int],
                       original_size: Tuple[int, int], conf_threshold: float = 0.5, iou_threshold: float = 0.5, shrink: float = 1.0, map_mode: str = 'auto', max_box_ratio: float = 0.9) -> List[dict]: